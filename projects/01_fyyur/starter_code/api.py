@@ -0,0 +1,98 @@
+#----------------------------------------------------------------------------#
+# JSON API, /api/v1.
+#
+# The routes live with the HTML views in app.py and load the same (cached)
+# data; this module holds the blueprint and what turns that data into
+# responses:
+#
+#   ?fields=id,name   keeps only those fields of each record (sparse fieldsets)
+#   orjson            encodes, when installed; the json module otherwise
+#   gzip              compresses bodies over GZIP_MIN_SIZE for clients that
+#                     accept it
+#
+# Errors are JSON too: {"error": {"status": 404, "message": "..."}}, also
+# for paths under /api/v1 that match no route or method (see is_api_request).
+#----------------------------------------------------------------------------#
+
+import gzip
+import json
+from datetime import date
+
+from flask import Blueprint, Response, abort, request
+from werkzeug.exceptions import HTTPException
+
+try:
+    import orjson
+except ImportError:  # optional; the json module gives the same output, slower
+    orjson = None
+
+API_VERSION = 'v1'
+MIMETYPE = 'application/json'
+# smaller bodies gain too little to be worth the CPU
+GZIP_MIN_SIZE = 1024
+GZIP_LEVEL = 6
+
+api = Blueprint('api', __name__, url_prefix='/api/' + API_VERSION)
+
+
+def _default(value):
+    if isinstance(value, date):
+        return value.isoformat()
+    raise TypeError('cannot encode %r' % (value,))
+
+
+def dumps(value):
+    """Compact JSON as bytes; datetimes as ISO 8601, like orjson writes them."""
+    if orjson is not None:
+        return orjson.dumps(value)
+    return json.dumps(value, separators=(',', ':'), ensure_ascii=False, default=_default).encode('utf-8')
+
+
+def requested_fields(available):
+    """The fields named by ?fields=a,b, in that order, or all of available
+    when it is absent; aborts with 400 on a field not in available."""
+    value = request.args.get('fields')
+    if not value:
+        return tuple(available)
+    fields = tuple(dict.fromkeys(name.strip() for name in value.split(',') if name.strip()))
+    unknown = [name for name in fields if name not in available]
+    if unknown or not fields:
+        abort(400, 'unknown fields: %s; available: %s' % (', '.join(unknown), ', '.join(available)))
+    return fields
+
+
+def pick(record, fields):
+    """A dict of the given fields of a dict or namedtuple."""
+    if hasattr(record, '_asdict'):
+        record = record._asdict()
+    return dict((name, record[name]) for name in fields)
+
+
+def respond(payload, status=200):
+    """Encode payload, gzipped if the client accepts it and it is worth it."""
+    body = dumps(payload)
+    response = Response(body, status=status, mimetype=MIMETYPE)
+    if len(body) >= GZIP_MIN_SIZE and request.accept_encodings['gzip']:
+        response.set_data(gzip.compress(body, compresslevel=GZIP_LEVEL))
+        response.headers['Content-Encoding'] = 'gzip'
+    response.vary.add('Accept-Encoding')
+    return response
+
+
+def is_api_request():
+    """Whether the request's path is under the API, even if no route matched
+    it; the app's 404 and 405 handlers then answer with error()."""
+    return request.path == api.url_prefix or request.path.startswith(api.url_prefix + '/')
+
+
+def error(e):
+    response = respond({'error': {'status': e.code, 'message': e.description}}, e.code)
+    if getattr(e, 'valid_methods', None):  # 405
+        response.allow.update(e.valid_methods)
+    return response
+
+
+# by code as well, or the app's HTML handlers for those codes would win
+api.register_error_handler(HTTPException, error)
+for code in (400, 404, 409, 500):
+    api.register_error_handler(code, error)
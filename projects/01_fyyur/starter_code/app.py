@@ -3,17 +3,36 @@
 #----------------------------------------------------------------------------#
 
 import json
+import threading
+from datetime import datetime, timedelta
 import dateutil.parser
-import babel
-from flask import Flask, render_template, request, Response, flash, redirect, url_for, abort
+from flask import Flask, render_template, request, Response, flash, redirect, url_for, abort, jsonify, stream_with_context
 from flask_moment import Moment
 from flask_sqlalchemy import SQLAlchemy
 import logging
-from logging import Formatter, FileHandler
+from logconfig import init_logging, init_request_ids
 from flask_wtf import Form
 from forms import *
-from models import app, db, Venue, Artist, Show
+from models import app, db, Venue, Artist, Show, VenueStats, ArtistStats
 from flask_migrate import Migrate
+from cache import ExpiringCache, on_commit
+from changefeed import ChangeFeed
+from autocomplete import PrefixIndex
+from availability import BookingIndex, BOOKING_LOCK_NAMESPACE
+from facets import GenreFacets
+from conditional import VersionCounters, conditional
+from routing import read_only, use_primary, stick_to_primary
+from querystats import QueryStats
+import queries
+import stats
+from formatting import format_datetime
+from importer import import_data
+from bench import bench
+from assets import StaticAssets
+from search import search_venues as search_venues_query, search_artists as search_artists_query
+from writes import EditConflict, update_changed, delete_rows
+from api import api, pick, requested_fields, respond, is_api_request, error as api_error
+from readmodels import VenueListing, ArtistListing, SearchResult, ShowListing
 #----------------------------------------------------------------------------#
 # App Config.
 #----------------------------------------------------------------------------#
@@ -22,7 +41,12 @@ from flask_migrate import Migrate
 moment = Moment(app)
 app.config.from_object('config')
 db.init_app(app)
+query_stats = QueryStats(app)
+static_assets = StaticAssets(app)
 #migrate = Migrate(app, db)
+app.cli.add_command(import_data)
+app.cli.add_command(bench)
+app.cli.add_command(stats.stats_cli)
 
 # TODO: (Done in config file) connect to a local postgresql database
 
@@ -31,16 +55,298 @@ db.init_app(app)
 # Filters.
 #----------------------------------------------------------------------------#
 
-def format_datetime(value, format='medium'):
-  date = dateutil.parser.parse(str(value))
-  if format == 'full':
-      format="EEEE MMMM, d, y 'at' h:mma"
-  elif format == 'medium':
-      format="EE MM, dd, y h:mma"
-  return babel.dates.format_datetime(date, format)
-
 app.jinja_env.filters['datetime'] = format_datetime
 
+#----------------------------------------------------------------------------#
+# Caches.
+#----------------------------------------------------------------------------#
+
+# (city, state) -> venues listing behind /venues, keyed by the genre filter
+area_index = ExpiringCache(maxsize=64)
+
+@on_commit
+def refresh_area_index(changes):
+  for change in changes:
+    if change.op == 'bulk' or change.model is Show or (change.model is Venue and (
+        change.op != 'update' or {'name', 'city', 'state', 'genres'} & set(change.previous))) or (
+        # the database cascades the delete to the artist's shows
+        change.model is Artist and change.op == 'delete'):
+      area_index.clear()
+      return
+
+# venue id -> context for pages/show_venue.html
+venue_pages = ExpiringCache(maxsize=2048)
+
+@on_commit
+def refresh_venue_pages(changes):
+  for change in changes:
+    if change.op == 'bulk':
+      venue_pages.clear()
+    elif change.model is Venue:
+      venue_pages.invalidate(change.values['id'])
+    elif change.model is Show:
+      venue_pages.invalidate(change.values['venue_id'])
+      if 'venue_id' in change.previous:
+        venue_pages.invalidate(change.previous['venue_id'])
+    elif change.model is Artist and (
+        change.op != 'update' or {'name', 'image_link'} & set(change.previous)):
+      # the artist may be listed on any number of venue pages
+      venue_pages.clear()
+
+# venue and artist names for /autocomplete, loaded on first use
+name_index = PrefixIndex()
+name_index_lock = threading.Lock()
+name_models = {'venue': Venue, 'artist': Artist}
+
+def loaded_name_index():
+  for kind, model in name_models.items():
+    if not name_index.loaded(kind):
+      with name_index_lock, use_primary():
+        if not name_index.loaded(kind):
+          name_index.load(kind, db.session.query(model.id, model.name))
+  return name_index
+
+@on_commit
+def refresh_name_index(changes):
+  for change in changes:
+    kind = {Venue: 'venue', Artist: 'artist'}.get(change.model)
+    if kind is None:
+      continue
+    if change.op == 'bulk':
+      name_index.load(kind, db.session.query(change.model.id, change.model.name))
+    elif change.op == 'delete':
+      name_index.remove(kind, change.values['id'])
+    elif change.op == 'insert' or 'name' in change.previous:
+      name_index.add(kind, change.values['id'], change.values['name'])
+
+# show bookings, for venue availability; loaded on first use with every show
+# that could still overlap a new booking
+bookings = BookingIndex(timedelta(minutes=app.config['SHOW_DURATION_MINUTES']))
+booking_lock = threading.Lock()
+
+def booking_index():
+  # tries again if a show was booked or deleted while loading; callers fall
+  # back to the database while the index isn't loaded
+  attempts = 3
+  while not bookings.loaded and attempts:
+    with booking_lock, use_primary():
+      if not bookings.loaded:
+        since = datetime.now() - bookings.duration
+        bookings.load(since, db.session.query(Show.id, Show.venue_id, Show.start_time)
+                               .filter(Show.start_time >= since).all)
+    attempts -= 1
+  return bookings
+
+@on_commit
+def refresh_bookings(changes):
+  for change in changes:
+    if change.op == 'bulk' or (change.model is Artist and change.op == 'delete'):
+      # rows went away or arrived without passing through the ORM
+      bookings.reset()
+    elif change.model is Venue and change.op == 'delete':
+      bookings.remove_venue(change.values['id'])
+    elif change.model is Show:
+      bookings.remove(change.values['id'])
+      if change.op != 'delete':
+        bookings.add(change.values['id'], change.values['venue_id'], change.values['start_time'])
+
+def venue_conflicts(venue_id, start_time):
+  # ids of the venue's shows that a new show at start_time would overlap.
+  # Asked of the primary, under a lock on the venue held until the
+  # transaction ends: another worker's booking may not have reached this
+  # process's index yet, and must not commit between the check and ours.
+  db.session.execute('SELECT pg_advisory_xact_lock(:namespace, :venue_id)',
+                     {'namespace': BOOKING_LOCK_NAMESPACE, 'venue_id': venue_id})
+  duration = bookings.duration
+  return [id for id, in db.session.query(Show.id).filter(
+    Show.venue_id == venue_id,
+    Show.start_time > start_time - duration,
+    Show.start_time < start_time + duration)]
+
+def booked_venues(start, end):
+  index = booking_index()
+  if index.covers(start):
+    return index.booked_venues(start, end)
+  return set(id for id, in db.session.query(Show.venue_id).distinct().filter(
+    Show.start_time > start - index.duration,
+    Show.start_time < end))
+
+# venues and artists per genre, loaded on first use
+genre_facets = GenreFacets()
+facet_models = {'venues': Venue, 'artists': Artist}
+
+def facet_counts(kind):
+  if genre_facets.loaded(kind):
+    return genre_facets.counts(kind)
+  model = facet_models[kind]
+  listed = db.session.query(model.id, db.func.unnest(model.genres).label('genre')).distinct().subquery()
+  counts = db.session.query(listed.c.genre, db.func.count()).group_by(listed.c.genre)
+  with use_primary():
+    return genre_facets.load(kind, counts.all)
+
+@on_commit
+def refresh_genre_facets(changes):
+  for change in changes:
+    kind = {Venue: 'venues', Artist: 'artists'}.get(change.model)
+    if kind is None:
+      continue
+    if change.op == 'bulk':
+      genre_facets.reset(kind)
+    elif change.op == 'insert':
+      genre_facets.add(kind, change.values['genres'])
+    elif change.op == 'delete':
+      genre_facets.remove(kind, change.values['genres'])
+    elif 'genres' in change.previous:
+      genre_facets.remove(kind, change.previous['genres'])
+      genre_facets.add(kind, change.values['genres'])
+
+# relays committed changes to and from the other worker processes, so that
+# every cache above stays current whichever process handled the write
+if app.config['CHANGE_FEED']:
+  change_feed = ChangeFeed(app, db, (Venue, Artist, Show))
+
+# per-table versions behind the pages' ETag/Last-Modified validators, kept
+# in the database by triggers and read from the primary
+def load_table_versions():
+  with db.engine.connect() as connection:
+    return connection.execute('SELECT table_name, version FROM table_version').fetchall()
+
+table_versions = VersionCounters(load_table_versions)
+
+@on_commit
+def refresh_table_versions(changes):
+  # the triggers have bumped every table written, cascades included
+  table_versions.refresh()
+
+def last_show_started():
+  # pages that split past from upcoming shows change whenever a show starts
+  return booking_index().last_started(datetime.now())
+
+@on_commit
+def read_your_writes(changes):
+  stick_to_primary(app)
+
+#----------------------------------------------------------------------------#
+# Helpers.
+#----------------------------------------------------------------------------#
+
+def stream_template(template_name, **context):
+  # like render_template, but sends the page as Jinja renders it
+  app.update_template_context(context)
+  template = app.jinja_env.get_template(template_name)
+  stream = template.stream(context)
+  stream.enable_buffering(5)
+  return Response(stream_with_context(stream))
+
+def parse_datetime_arg(name):
+  value = request.args.get(name)
+  if not value:
+    return None
+  try:
+    return datetime.fromisoformat(value)
+  except ValueError:
+    abort(400)
+
+def parse_date_arg(name):
+  value = request.args.get(name)
+  if not value:
+    return None
+  try:
+    return datetime.strptime(value, '%Y-%m-%d')
+  except ValueError:
+    abort(400)
+
+def parse_genre_args():
+  # ?genre=Jazz&genre=Folk keeps rows listing every one of the genres
+  return tuple(sorted(set(genre for genre in request.args.getlist('genre') if genre)))
+
+def venue_listing(genres):
+  # /venues' areas, as cached
+  with use_primary():
+    return area_index.get_or_load(genres, lambda: queries.venue_areas(datetime.now(), genres))
+
+def venue_page(venue_id):
+  # the venue page's data, as cached; 404 without such a venue
+  with use_primary():
+    data = venue_pages.get_or_load(venue_id, lambda: queries.venue_detail(venue_id, datetime.now()))
+  if data is None:
+    abort(404)
+  return data
+
+def artist_page(artist_id):
+  # the artist page's data; each list of shows is one page of the artist's
+  # schedule, paged through with ?upcoming=/?past= cursors
+  artist = Artist.query.get_or_404(artist_id)
+  now = datetime.now()
+  limit = app.config['SCHEDULE_PAGE_SIZE']
+  try:
+    upcoming_shows, upcoming_next = queries.artist_schedule(
+      artist_id, now, 'upcoming', limit, request.args.get('upcoming'))
+    past_shows, past_next = queries.artist_schedule(
+      artist_id, now, 'past', limit, request.args.get('past'))
+  except ValueError:
+    abort(400)
+  upcoming_count, past_count = (stats.show_counts(ArtistStats, artist_id, now)
+                                or queries.artist_show_counts(artist_id, now))
+
+  return {'id': artist_id,
+    'name': artist.name,
+    'city': artist.city,
+    'state': artist.state,
+    'phone': artist.phone,
+    'image_link': artist.image_link,
+    'facebook_link': artist.facebook_link,
+    'website': artist.website,
+    'genres': artist.genres,
+    'seeking_venue': artist.seeking_venue,
+    'seeking_description': artist.seeking_description,
+    'upcoming_shows': upcoming_shows,
+    'past_shows': past_shows,
+    'upcoming_next': upcoming_next,
+    'past_next': past_next,
+    'upcoming_shows_count': upcoming_count,
+    'past_shows_count': past_count}
+
+def artist_schedule_page(artist_id):
+  # ?direction=upcoming|past&limit=N&cursor=... of an artist's schedule
+  direction = request.args.get('direction', 'upcoming')
+  limit = request.args.get('limit', app.config['SCHEDULE_PAGE_SIZE'], type=int)
+  limit = max(1, min(limit, app.config['SCHEDULE_MAX_PAGE_SIZE']))
+  try:
+    return queries.artist_schedule(artist_id, datetime.now(), direction, limit, request.args.get('cursor'))
+  except ValueError:
+    abort(400)
+
+def artist_directory(genres):
+  # one page of /artists by name: ?from=<letter> starts at that letter,
+  # ?after=<cursor> continues from the previous page
+  return queries.artists_page(app.config['ARTISTS_PAGE_SIZE'], genres,
+                              request.args.get('after'), request.args.get('from'))
+
+def shows_listing():
+  # one page of /shows:
+  #   ?from=YYYY-MM-DD&to=YYYY-MM-DD (both inclusive) narrows the dates,
+  #   ?after=<cursor> continues from the previous page
+  start = parse_date_arg('from')
+  end = parse_date_arg('to')
+  if end is not None:
+    end += timedelta(days=1)
+  try:
+    return queries.shows_page(app.config['SHOWS_PAGE_SIZE'], start, end, request.args.get('after'))
+  except ValueError:
+    abort(400)
+
+def parse_version():
+  # the row version an edit form was loaded with
+  try:
+    return int(request.form.get('version', ''))
+  except ValueError:
+    abort(400)
+
+def parse_seeking(name):
+  # the select submits True/False; older forms sent Yes/No
+  return request.form.get(name) not in ('False', 'No')
+
 #----------------------------------------------------------------------------#
 # Controllers.
 #----------------------------------------------------------------------------#
@@ -50,94 +356,107 @@ def index():
   return render_template('pages/home.html')
 
 
+@app.route('/autocomplete')
+def autocomplete():
+  # type-ahead for the search boxes: ?q=<prefix>[&type=venue|artist][&limit=N]
+  kind = request.args.get('type')
+  if kind not in (None, 'venue', 'artist'):
+    abort(400)
+  limit = max(1, min(request.args.get('limit', 10, type=int), 50))
+  results = [{
+    'type': entry_kind,
+    'id': entry_id,
+    'name': name,
+    'url': url_for('show_' + entry_kind, **{entry_kind + '_id': entry_id})
+  } for entry_kind, entry_id, name in loaded_name_index().complete(request.args.get('q', ''), kind, limit)]
+  return jsonify(results=results)
+
+
 #  Venues
 #  ----------------------------------------------------------------
 
 @app.route('/venues')
+@conditional(table_versions, ('Venue', 'Show'), clock=last_show_started)
+@read_only
 def venues():
-  # TODO: replace with real venues data.
-  #       num_shows should be aggregated based on number of upcoming shows per venue.
-  areas=[]
-  data= Venue.query.all()
-  for place in Venue.query.distinct(Venue.city,Venue.state).all():
-    areas.append({
-      'city':place.city,
-      'state': place.state,
-      'venues':[{
-        'id': d.id,
-        'name': d.name
-      } for d in data if d.city == place.city and d.state == place.state]
-    })
-  return render_template('pages/venues.html', areas=areas)
+  genres = parse_genre_args()
+  return render_template('pages/venues.html', areas=venue_listing(genres), genres=genres, facets=facet_counts('venues'))
 
 @app.route('/venues/search', methods=['POST'])
+@read_only
 def search_venues():
-
+  # case-insensitive partial match on name, plus full-text matches on name,
+  # city and genres; e.g. "Hop" finds "The Musical Hop"
   search = request.form.get('search_term', '')
-  venues=Venue.query.filter(Venue.name.ilike('%'+search+'%')).all()
-  data=[]
-  for venue in venues:
-    data.append(venue)
-  response={
-    "count":len(venues),
-    "data":data
-    
-    }
-  
-
-  # TODO: implement search on artists with partial string search. Ensure it is case-insensitive.
-  # seach for Hop should return "The Musical Hop".
-  # search for "Music" should return "The Musical Hop" and "Park Square Live Music & Coffee"
-  # response={
-  #   "count": 1,
-  #   "data": [{
-  #     "id": 2,
-  #     "name": "The Dueling Pianos Bar",
-  #     "num_upcoming_shows": 0,
-  #   }]
-  # }
-  return render_template('pages/search_venues.html', results=response, data=data,search_term=search)
+  response = search_venues_query(search, datetime.now(), app.config['SEARCH_RESULT_LIMIT'])
+  return render_template('pages/search_venues.html', results=response, data=response['data'], search_term=search)
 
 @app.route('/venues/<int:venue_id>')
+@conditional(table_versions, ('Venue', 'Show', 'Artist'), clock=last_show_started)
+@read_only
 def show_venue(venue_id):
   # shows the venue page with the given venue_id
-  # TODO: replace with real venue data from the venues table, using venue_id
-
-  venue = Venue.query.filter_by(id=venue_id).first_or_404()
- 
-  past_shows = db.session.query(Artist, Show).join(Show).join(Venue).filter(Show.venue_id == venue_id,Show.artist_id == Artist.id,Show.start_time < datetime.now()).all()
-  upcoming_shows = db.session.query(Artist, Show).join(Show).join(Venue).filter(Show.venue_id == venue_id,Show.artist_id == Artist.id,Show.start_time > datetime.now()).all()
-
-  data= {'id': venue_id,
-    'name': venue.name,
-    'city': venue.city,
-    'state': venue.state,
-    'address': venue.address,
-    'phone': venue.phone,
-    'image_link': venue.image_link,
-    'facebook_link': venue.facebook_link,
-    'website': venue.website,
-    'genres': venue.genres,
-    'seeking_talent': venue.seeking_talent,
-    'seeking_description': venue.seeking_description,
-    'upcoming_shows': [{
-      'artist_id': artist.id,
-      'artist_name': artist.name,
-      'artist_image_link': artist.image_link,
-      'start_time': show.start_time
-        } for artist, show in upcoming_shows], 
-    'past_shows': [{
-      'artist_id': artist.id,
-      "artist_name": artist.name,
-      "artist_image_link": artist.image_link,
-      "start_time": show.start_time
-      } for artist, show in past_shows],  
-    'upcoming_shows_count': len(upcoming_shows),
-    'past_shows_count': len(past_shows)}
-  
-  
-
-  return render_template('pages/show_venue.html', venue=data)
+  return render_template('pages/show_venue.html', venue=venue_page(venue_id))
+
+@app.route('/venues/availability')
+@read_only
+def venue_availability():
+  # venues with no show overlapping a window, as JSON:
+  #   ?date=YYYY-MM-DD for a whole day, or ?start=<ISO>[&end=<ISO>]
+  #   (end defaults to one show slot), plus an optional &limit=N
+  day = parse_date_arg('date')
+  if day is not None:
+    start, end = day, day + timedelta(days=1)
+  else:
+    start = parse_datetime_arg('start')
+    if start is None:
+      abort(400)
+    end = parse_datetime_arg('end') or start + bookings.duration
+  if end <= start:
+    abort(400)
+  limit = max(1, min(request.args.get('limit', 100, type=int), 1000))
+
+  booked = booked_venues(start, end)
+  free = db.session.query(Venue.id, Venue.name, Venue.city, Venue.state)
+  if booked:
+    free = free.filter(Venue.id.notin_(booked))
+  return jsonify(
+    start=start.isoformat(),
+    end=end.isoformat(),
+    booked_count=len(booked),
+    venues=[row._asdict() for row in free.order_by(Venue.name).limit(limit)])
+
+@app.route('/venues/<int:venue_id>/bookings')
+@read_only
+def venue_bookings(venue_id):
+  # a venue's booked slots on ?date=YYYY-MM-DD (default today), as JSON
+  day = parse_date_arg('date') or datetime.combine(datetime.now().date(), datetime.min.time())
+  end = day + timedelta(days=1)
+  index = booking_index()
+  if index.covers(day):
+    slots = index.bookings(venue_id, day, end)
+  else:
+    slots = db.session.query(Show.start_time, Show.id).filter(
+      Show.venue_id == venue_id,
+      Show.start_time > day - index.duration,
+      Show.start_time < end).order_by(Show.start_time).all()
+  return jsonify(bookings=[{
+    'show_id': show_id,
+    'start_time': start_time.isoformat(),
+    'end_time': (start_time + index.duration).isoformat()
+  } for start_time, show_id in slots])
+
+@app.route('/genres')
+@conditional(table_versions, ('Venue', 'Artist'))
+@read_only
+def genres():
+  # number of venues and artists listing each genre, as JSON; ?kind=venues
+  # or ?kind=artists for one of them
+  kinds = request.args.getlist('kind') or sorted(facet_models)
+  if not set(kinds) <= set(facet_models):
+    abort(400)
+  return jsonify(dict((kind, [{'genre': genre, 'count': count} for genre, count in facet_counts(kind)])
+                      for kind in kinds))
 
 #  Create Venue
 #  ----------------------------------------------------------------
@@ -194,11 +513,11 @@ def create_venue_submission():
 @app.route('/venues/<venue_id>/delete', methods=['GET','POST'])
 def delete_venue(venue_id):
   error=False
+  deleted=[]
   try:
-    d=Venue.query.filter_by(id=venue_id).first()
-    db.session.delete(d)
-    db.session.commit()
-    flash('Venue deleted successfully!')
+    deleted=delete_rows(Venue, [int(venue_id)])
+    if deleted:
+      flash('Venue deleted successfully!')
   except Exception:
     flash('An error occurred. The venue could not be deleted.')
     error=True
@@ -209,6 +528,8 @@ def delete_venue(venue_id):
     db.session.close()
   if error:
     return render_template('/errors/500.html')
+  elif not deleted:
+    abort(404)
     
   # BONUS CHALLENGE: Implement a button to delete a Venue on a Venue Page, have it so that
   # clicking that button delete it from the db then redirect the user to the homepage
@@ -219,65 +540,52 @@ def delete_venue(venue_id):
 #  Artists
 #  ----------------------------------------------------------------
 @app.route('/artists')
+@conditional(table_versions, ('Artist',))
+@read_only
 def artists():
-  # TODO: replace with real data returned from querying the database
-  data= Artist.query.all()
-  return render_template('pages/artists.html', artists=data)
+  # one page of artists at a time, the next loaded by /artists/more as the
+  # list scrolls (or by following the "more" link)
+  genres = parse_genre_args()
+  data, next_cursor = artist_directory(genres)
+  return render_template('pages/artists.html', artists=data, next_cursor=next_cursor,
+    start=request.args.get('from'), genres=genres, facets=facet_counts('artists'))
+
+@app.route('/artists/more')
+@conditional(table_versions, ('Artist',))
+@read_only
+def more_artists():
+  # the next page of /artists for infinite scroll: its list items as HTML,
+  # and where the page after it is (null on the last page)
+  genres = parse_genre_args()
+  data, next_cursor = artist_directory(genres)
+  return jsonify(
+    html=render_template('pages/artist_items.html', artists=data),
+    next=next_cursor and url_for('more_artists', genre=genres, after=next_cursor),
+    page=next_cursor and url_for('artists', genre=genres, after=next_cursor))
 
 @app.route('/artists/search', methods=['POST'])
+@read_only
 def search_artists():
+  # e.g. "A" finds "Guns N Petals", "Matt Quevado" and "The Wild Sax Band"
   search = request.form.get('search_term', '')
-  artists=Artist.query.filter(Artist.name.ilike('%'+search+'%')).all()
-  data=[]
-  for artist in artists:
-    data.append(artist)
-  response={
-    "count":len(artists),
-    "data":data
-    
-    }
-  # TODO: implement search on artists with partial string search. Ensure it is case-insensitive.
-  # seach for "A" should return "Guns N Petals", "Matt Quevado", and "The Wild Sax Band".
-  # search for "band" should return "The Wild Sax Band".
-  
-  return render_template('pages/search_artists.html', results=response, search_term=search, data=data)
+  response = search_artists_query(search, datetime.now(), app.config['SEARCH_RESULT_LIMIT'])
+  return render_template('pages/search_artists.html', results=response, search_term=search, data=response['data'])
 
 @app.route('/artists/<int:artist_id>', methods=['GET'])
+@conditional(table_versions, ('Artist', 'Show', 'Venue'), clock=last_show_started)
+@read_only
 def show_artist(artist_id):
-  # shows the venue page with the given venue_id
-  # TODO: replace with real venue data from the venues table, using venue_id
-  
-  artist = Artist.query.filter_by(id=artist_id).first_or_404()
-
-  past_shows = db.session.query(Venue, Show).join(Show).join(Artist).filter(Show.artist_id == artist_id,Show.venue_id == Venue.id,Show.start_time < datetime.now()).all()
-  upcoming_shows = db.session.query(Venue, Show).join(Show).join(Artist).filter(Show.artist_id == artist_id,Show.venue_id == Venue.id,Show.start_time > datetime.now()).all()
-
-  data= {'id': artist_id,
-    'name': artist.name,
-    'city': artist.city,
-    'state': artist.state,
-    'phone': artist.phone,
-    'image_link': artist.image_link,
-    'facebook_link': artist.facebook_link,
-    'website': artist.website,
-    'genres': artist.genres,
-    'seeking_venue': artist.seeking_venue,
-    'seeking_description': artist.seeking_description,
-    'upcoming_shows': [{
-      'venue_id': venue.id,
-      'venue_name': venue.name,
-      'venue_image_link': venue.image_link,
-      'start_time': show.start_time
-        } for venue, show in upcoming_shows], 
-    'past_shows': [{
-      'venue_id': venue.id,
-      "venue_name": venue.name,
-      "venue_image_link": venue.image_link,
-      "start_time": show.start_time
-      } for venue, show in past_shows],  
-    'upcoming_shows_count': len(upcoming_shows),
-    'past_shows_count': len(past_shows)}
-  return render_template('pages/show_artist.html', artist=data)
+  # shows the artist page with the given artist_id
+  return render_template('pages/show_artist.html', artist=artist_page(artist_id))
+
+@app.route('/artists/<int:artist_id>/shows', methods=['GET'])
+@read_only
+def artist_schedule(artist_id):
+  # JSON schedule for an artist: ?direction=upcoming|past&limit=N&cursor=...
+  shows, next_cursor = artist_schedule_page(artist_id)
+  for show in shows:
+    show['start_time'] = show['start_time'].isoformat()
+  return jsonify(shows=shows, next_cursor=next_cursor)
 
 #  Update
 #  ----------------------------------------------------------------
@@ -295,6 +603,7 @@ def edit_artist(artist_id):
   form.website.data=artist.website
   form.seeking_venue.data=artist.seeking_venue
   form.seeking_description.data=artist.seeking_description
+  form.version.data=artist.version
 
   # TODO: populate form with fields from artist with ID <artist_id>
   return render_template('forms/edit_artist.html', form=form, artist=artist)
@@ -302,29 +611,31 @@ def edit_artist(artist_id):
 @app.route('/artists/<int:artist_id>/edit', methods=['POST'])
 def edit_artist_submission(artist_id):
   form = ArtistForm()
-  artist = Artist.query.get(artist_id)
-  artist.name=request.form.get('name', '')
-  artist.city=request.form.get('city', '')
-  artist.state=request.form.get('state', '')
-  artist.phone=request.form.get('phone','')
-  artist.image_link=request.form.get('image_link', '')
-  artist.genres=request.form.getlist('genres')
-  artist.facebook_link=request.form.get('facebook_link','')
-  artist.website=request.form.get('website','')
-  artist.seeking_venue=request.form.get('seeking_venue')
-  artist.seeking_description=request.form.get('seeking_description','')
-  
-  if artist.seeking_venue=='No':
-    artist.seeking_venue=False
-  else:
-    artist.seeking_venue=True
-
-  db.session.commit()
-
-  # TODO: take values from the form submitted, and update existing
-  # artist record with ID <artist_id> using the new attributes
+  version = parse_version()
+  # only the columns that changed are written, and only if nobody else
+  # saved the artist since this form was loaded
+  try:
+    previous = update_changed(Artist, artist_id, version, {
+      'name': request.form.get('name', ''),
+      'city': request.form.get('city', ''),
+      'state': request.form.get('state', ''),
+      'phone': request.form.get('phone',''),
+      'image_link': request.form.get('image_link', ''),
+      'genres': request.form.getlist('genres'),
+      'facebook_link': request.form.get('facebook_link',''),
+      'website': request.form.get('website',''),
+      'seeking_venue': parse_seeking('seeking_venue'),
+      'seeking_description': request.form.get('seeking_description',''),
+    })
+  except EditConflict:
+    artist = Artist.query.get_or_404(artist_id)
+    form.version.data = artist.version
+    flash('Artist ' + artist.name + ' was changed by someone else while you were editing. Saving again will overwrite their changes.')
+    return render_template('forms/edit_artist.html', form=form, artist=artist), 409
+  if previous is None:
+    abort(404)
 
-  return redirect(url_for('show_artist', form=form, artist_id=artist_id))
+  return redirect(url_for('show_artist', artist_id=artist_id))
 
 @app.route('/venues/<int:venue_id>/edit', methods=['GET'])
 def edit_venue(venue_id):
@@ -341,36 +652,36 @@ def edit_venue(venue_id):
   form.website.data=venue.website
   form.seeking_talent.data=venue.seeking_talent
   form.seeking_description.data=venue.seeking_description
+  form.version.data=venue.version
   # TODO: populate form with values from venue with ID <venue_id>
   return render_template('forms/edit_venue.html', form=form, venue=venue)
 
 @app.route('/venues/<int:venue_id>/edit', methods=['POST'])
 def edit_venue_submission(venue_id):
   form=VenueForm(request.form)
-  venue=Venue.query.get(venue_id)
-  venue.name=request.form.get('name', '')
-  venue.city=request.form.get('city', '')
-  venue.state=request.form.get('state', '')
-  venue.address=request.form.get('address','')
-  venue.phone=request.form.get('phone','')
-  venue.image_link=request.form.get('image_link', '')
-  venue.genres=request.form.getlist('genres')
-  venue.facebook_link=request.form.get('facebook_link','')
-  venue.website=request.form.get('website','')
-  venue.seeking_talent=request.form.get('seeking_talent')
-  venue.seeking_description=request.form.get('seeking_description','')
-  
-  if venue.seeking_talent=='No':
-    venue.seeking_talent=False
-  else:
-    venue.seeking_talent=True
-
-  
-  #venue=Venue(name=name, city=city, state=state, address=address, phone=phone, image_link=image_link, genres=genres, facebook_link=facebook_link,website=website,seeking_description=seeking_description)
-  db.session.commit()
-  # TODO: take values from the form submitted, and update existing
-  # venue record with ID <venue_id> using the new attributes
-  return redirect(url_for('show_venue', form=form, venue_id=venue_id))
+  version = parse_version()
+  try:
+    previous = update_changed(Venue, venue_id, version, {
+      'name': request.form.get('name', ''),
+      'city': request.form.get('city', ''),
+      'state': request.form.get('state', ''),
+      'address': request.form.get('address',''),
+      'phone': request.form.get('phone',''),
+      'image_link': request.form.get('image_link', ''),
+      'genres': request.form.getlist('genres'),
+      'facebook_link': request.form.get('facebook_link',''),
+      'website': request.form.get('website',''),
+      'seeking_talent': parse_seeking('seeking_talent'),
+      'seeking_description': request.form.get('seeking_description',''),
+    })
+  except EditConflict:
+    venue = Venue.query.get_or_404(venue_id)
+    form.version.data = venue.version
+    flash('Venue ' + venue.name + ' was changed by someone else while you were editing. Saving again will overwrite their changes.')
+    return render_template('forms/edit_venue.html', form=form, venue=venue), 409
+  if previous is None:
+    abort(404)
+  return redirect(url_for('show_venue', venue_id=venue_id))
 
 #  Create Artist
 #  ----------------------------------------------------------------
@@ -426,11 +737,11 @@ def create_artist_submission():
 @app.route('/artists/<artist_id>/delete', methods=['GET','POST'])
 def delete_artist(artist_id):
   error=False
+  deleted=[]
   try:
-    d=Artist.query.filter_by(id=artist_id).first()
-    db.session.delete(d)
-    db.session.commit()
-    flash('Artist deleted successfully!')
+    deleted=delete_rows(Artist, [int(artist_id)])
+    if deleted:
+      flash('Artist deleted successfully!')
   except Exception:
     flash('An error occurred. The artist could not be deleted.')
     error=True
@@ -441,6 +752,8 @@ def delete_artist(artist_id):
     db.session.close()
   if error:
     return render_template('/errors/500.html')
+  elif not deleted:
+    abort(404)
     
   # BONUS CHALLENGE: Implement a button to delete a Venue on a Venue Page, have it so that
   # clicking that button delete it from the db then redirect the user to the homepage
@@ -454,12 +767,11 @@ def delete_artist(artist_id):
 #  ----------------------------------------------------------------
 
 @app.route('/shows')
+@conditional(table_versions, ('Show', 'Artist', 'Venue'))
+@read_only
 def shows():
-  # displays list of shows at /shows
-  # TODO: replace with real venues data.
-  #       num_shows should be aggregated based on number of upcoming shows per venue.
-  data= Show.query.order_by(Show.start_time)
-  return render_template('pages/shows.html', shows=data)
+  # displays list of shows at /shows, one page at a time (see shows_listing)
+  return stream_template('pages/shows.html', shows=shows_listing())
 
 @app.route('/shows/create')
 def create_shows():
@@ -474,15 +786,24 @@ def create_show_submission():
   artist_id=request.form.get('artist_id', '')
   venue_id=request.form.get('venue_id', '')
   start_time=request.form.get('start_time', '')
+  double_booked=False
   try:
-    show=Show(artist_id=artist_id, venue_id=venue_id, start_time=start_time)
-    db.session.add(show)
-    db.session.commit()
+    show=Show(artist_id=int(artist_id), venue_id=int(venue_id), start_time=dateutil.parser.parse(start_time))
+    if venue_conflicts(show.venue_id, show.start_time):
+      double_booked=True
+      db.session.rollback()
+    else:
+      db.session.add(show)
+      stats.add_show(show.venue_id, show.artist_id, show.start_time, datetime.now())
+      db.session.commit()
   # called to create new shows in the db, upon submitting new show listing form
   # TODO: insert form data as a new Show record in the db, instead
 
   # on successful db insert, flash success
-    flash('Show was successfully listed!')
+    if double_booked:
+      flash('The venue is already booked at that time. Show could not be listed.')
+    else:
+      flash('Show was successfully listed!')
   except Exception:
     error=True
     db.session.rollback()
@@ -494,17 +815,19 @@ def create_show_submission():
   # see: http://flask.pocoo.org/docs/1.0/patterns/flashing/
   if error:
     return render_template('/errors/500.html')
+  elif double_booked:
+    return render_template('forms/new_show.html', form=form), 409
   else:
     return redirect(url_for('shows'))
 
 @app.route('/shows/<show_id>/delete', methods=['GET','POST'])
 def delete_show(show_id):
   error=False
+  deleted=[]
   try:
-    d=Show.query.filter_by(id=show_id).first()
-    db.session.delete(d)
-    db.session.commit()
-    flash('Show deleted successfully!')
+    deleted=delete_rows(Show, [int(show_id)])
+    if deleted:
+      flash('Show deleted successfully!')
   except Exception:
     flash('An error occurred. The show could not be deleted.')
     error=True
@@ -515,13 +838,133 @@ def delete_show(show_id):
     db.session.close()
   if error:
     return render_template('/errors/500.html')
+  elif not deleted:
+    abort(404)
   else:
     return redirect(url_for('index'))
 
+#  Top Venues and Artists
+#  ----------------------------------------------------------------
+
+@app.route('/top')
+@read_only
+def top():
+  # the venues and artists with the most upcoming shows, or with ?by=total
+  # the most shows overall; read off the VenueStats/ArtistStats indexes
+  by = request.args.get('by', 'upcoming')
+  if by not in ('upcoming', 'total'):
+    abort(400)
+  limit = app.config['TOP_LIMIT']
+  # a row whose next show has started counts it as upcoming until written
+  # to or rolled (`flask stats roll`, from cron)
+  return render_template('pages/top.html', by=by,
+    venues=stats.top(VenueStats, Venue, by, limit),
+    artists=stats.top(ArtistStats, Artist, by, limit))
+
+#  Bulk Delete
+#  ----------------------------------------------------------------
+
+@app.route('/<any(venues, artists, shows):kind>/delete', methods=['POST'])
+def bulk_delete(kind):
+  # deletes many rows in one statement, e.g. POST /shows/delete with a JSON
+  # body {"ids": [1, 2, 3]} or form fields ids=1,2,3; a venue's or artist's
+  # shows go with it. Responds with the ids deleted and the ids not found.
+  model = {'venues': Venue, 'artists': Artist, 'shows': Show}[kind]
+  payload = request.get_json(silent=True)
+  if isinstance(payload, dict):
+    values = payload.get('ids')
+  else:
+    values = ','.join(request.form.getlist('ids')).split(',')
+  try:
+    ids = set(int(value) for value in values if str(value).strip())
+  except (TypeError, ValueError):
+    abort(400)
+  if not ids or len(ids) > app.config['BULK_DELETE_MAX_IDS']:
+    abort(400)
+  deleted = set(row['id'] for row in delete_rows(model, ids))
+  return jsonify(deleted=sorted(deleted), missing=sorted(ids - deleted))
+
+#  JSON API
+#  ----------------------------------------------------------------
+#  /api/v1: the same data as the pages above, as JSON (see api.py)
+
+API_VENUE_FIELDS = VenueListing._fields + ('city', 'state')
+
+@api.route('/venues')
+@conditional(table_versions, ('Venue', 'Show'), clock=last_show_started)
+@read_only
+def api_venues():
+  fields = requested_fields(API_VENUE_FIELDS)
+  return respond({'data': [
+    pick(dict(venue._asdict(), city=area['city'], state=area['state']), fields)
+    for area in venue_listing(parse_genre_args()) for venue in area['venues']]})
+
+@api.route('/venues/<int:venue_id>')
+@conditional(table_versions, ('Venue', 'Show', 'Artist'), clock=last_show_started)
+@read_only
+def api_venue(venue_id):
+  data = venue_page(venue_id)
+  return respond({'data': pick(data, requested_fields(data))})
+
+@api.route('/venues/search')
+@read_only
+def api_search_venues():
+  fields = requested_fields(SearchResult._fields)
+  results = search_venues_query(request.args.get('q', ''), datetime.now(), app.config['SEARCH_RESULT_LIMIT'])
+  return respond({'count': results['count'], 'data': [pick(venue, fields) for venue in results['data']]})
+
+@api.route('/artists')
+@conditional(table_versions, ('Artist',))
+@read_only
+def api_artists():
+  fields = requested_fields(ArtistListing._fields)
+  data, next_cursor = artist_directory(parse_genre_args())
+  return respond({'data': [pick(artist, fields) for artist in data], 'next_cursor': next_cursor})
+
+@api.route('/artists/<int:artist_id>')
+@conditional(table_versions, ('Artist', 'Show', 'Venue'), clock=last_show_started)
+@read_only
+def api_artist(artist_id):
+  data = artist_page(artist_id)
+  return respond({'data': pick(data, requested_fields(data))})
+
+@api.route('/artists/<int:artist_id>/shows')
+@read_only
+def api_artist_schedule(artist_id):
+  fields = requested_fields(('venue_id', 'venue_name', 'venue_image_link', 'start_time'))
+  shows, next_cursor = artist_schedule_page(artist_id)
+  return respond({'data': [pick(show, fields) for show in shows], 'next_cursor': next_cursor})
+
+@api.route('/artists/search')
+@read_only
+def api_search_artists():
+  fields = requested_fields(SearchResult._fields)
+  results = search_artists_query(request.args.get('q', ''), datetime.now(), app.config['SEARCH_RESULT_LIMIT'])
+  return respond({'count': results['count'], 'data': [pick(artist, fields) for artist in results['data']]})
+
+@api.route('/shows')
+@conditional(table_versions, ('Show', 'Artist', 'Venue'))
+@read_only
+def api_shows():
+  fields = requested_fields(ShowListing._fields)
+  page = shows_listing()
+  data = [pick(show, fields) for show in page]
+  return respond({'data': data, 'next_cursor': page.next_cursor})
+
+app.register_blueprint(api)
+
 @app.errorhandler(404)
 def not_found_error(error):
+    if is_api_request():
+        return api_error(error)
     return render_template('errors/404.html'), 404
 
+@app.errorhandler(405)
+def method_not_allowed(error):
+    if is_api_request():
+        return api_error(error)
+    return error
+
 @app.errorhandler(500)
 def server_error(error):
     return render_template('errors/500.html'), 500
@@ -537,14 +980,9 @@ def duplicate_resource(error):
 
 
 
+init_request_ids(app)
 if not app.debug:
-    file_handler = FileHandler('error.log')
-    file_handler.setFormatter(
-        Formatter('%(asctime)s %(levelname)s: %(message)s [in %(pathname)s:%(lineno)d]')
-    )
-    app.logger.setLevel(logging.INFO)
-    file_handler.setLevel(logging.INFO)
-    app.logger.addHandler(file_handler)
+    init_logging(app)
     app.logger.info('errors')
 
 #----------------------------------------------------------------------------#
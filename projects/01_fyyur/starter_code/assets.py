@@ -0,0 +1,181 @@
+#----------------------------------------------------------------------------#
+# Fingerprinted, precompressed static assets.
+#
+#   flask build-assets
+#
+# copies every file under static/ to static/build/ with a content hash in
+# its name (css/main.css -> build/css/main.3f2a1b9c07d4.css), next to .gz
+# and, if the brotli package is installed, .br variants, and records the
+# mapping in static/build/manifest.json. CSS url(...) references to other
+# assets are rewritten to their hashed names too.
+#
+# With STATIC_FINGERPRINT on, url_for('static', filename=...) returns the
+# hashed name and the static view serves it, in the best encoding the client
+# accepts, as immutable for a year: the name changes whenever the content does.
+#----------------------------------------------------------------------------#
+
+import gzip
+import hashlib
+import json
+import mimetypes
+import os
+import posixpath
+import re
+
+import click
+from flask import current_app, request, send_file
+from flask.cli import with_appcontext
+
+try:
+    import brotli
+except ImportError:  # optional; without it only gzip variants are written
+    brotli = None
+
+BUILD_DIR = 'build'
+MANIFEST = 'manifest.json'
+# worth compressing; images and woff fonts already are
+COMPRESSIBLE = ('.css', '.js', '.map', '.svg', '.ttf', '.otf', '.eot', '.json', '.txt', '.html')
+ENCODINGS = (('br', '.br'), ('gzip', '.gz'))
+YEAR = 365 * 24 * 60 * 60
+
+_css_url = re.compile(r'''url\(\s*(['"]?)([^'")]+)\1\s*\)''')
+
+
+def _hashed_name(path, content):
+    root, ext = posixpath.splitext(path)
+    return '%s.%s%s' % (root, hashlib.sha256(content).hexdigest()[:12], ext)
+
+
+def _rewrite_css(path, content, manifest):
+    # point url(...) at the hashed names, keeping any ?query or #fragment
+    directory = posixpath.dirname(path)
+
+    def replace(match):
+        quote, url = match.groups()
+        if re.match(r'^(data:|[a-z]+:|//|/)', url):
+            return match.group(0)
+        target, suffix = re.match(r'^([^?#]*)(.*)$', url).groups()
+        hashed = manifest.get(posixpath.normpath(posixpath.join(directory, target)))
+        if hashed is None:
+            return match.group(0)
+        relative = posixpath.relpath(posixpath.join(BUILD_DIR, hashed), posixpath.join(BUILD_DIR, directory))
+        return 'url(%s%s%s%s)' % (quote, relative, suffix, quote)
+
+    return _css_url.sub(replace, content.decode('utf-8')).encode('utf-8')
+
+
+def _write(path, content):
+    os.makedirs(os.path.dirname(path), exist_ok=True)
+    temporary = '%s.%d.tmp' % (path, os.getpid())
+    with open(temporary, 'wb') as f:
+        f.write(content)
+    os.replace(temporary, path)
+
+
+def build(static_folder):
+    """Write the hashed and compressed copies and the manifest; returns the
+    manifest ({source path: hashed path}, both relative to static/)."""
+    build_folder = os.path.join(static_folder, BUILD_DIR)
+    sources = []
+    for directory, subdirectories, files in os.walk(static_folder):
+        if os.path.abspath(directory) == os.path.abspath(build_folder):
+            subdirectories[:] = []
+            continue
+        for name in files:
+            path = os.path.relpath(os.path.join(directory, name), static_folder).replace(os.sep, '/')
+            sources.append(path)
+    # CSS last, so that the files it references already have hashed names
+    sources.sort(key=lambda path: (path.endswith('.css'), path))
+
+    manifest = {}
+    for path in sources:
+        with open(os.path.join(static_folder, path), 'rb') as f:
+            content = f.read()
+        if path.endswith('.css'):
+            content = _rewrite_css(path, content, manifest)
+        hashed = _hashed_name(path, content)
+        target = os.path.join(build_folder, hashed)
+        if not os.path.exists(target):
+            _write(target, content)
+            if path.endswith(COMPRESSIBLE):
+                compressed = gzip.compress(content, compresslevel=9, mtime=0)
+                if len(compressed) < len(content):
+                    _write(target + '.gz', compressed)
+                if brotli is not None:
+                    compressed = brotli.compress(content)
+                    if len(compressed) < len(content):
+                        _write(target + '.br', compressed)
+        manifest[path] = BUILD_DIR + '/' + hashed
+
+    _write(os.path.join(build_folder, MANIFEST), json.dumps(manifest, indent=1, sort_keys=True).encode())
+    return manifest
+
+
+class StaticAssets(object):
+    """Rewrites static URLs to hashed names and serves those names."""
+
+    def __init__(self, app=None):
+        self.manifest = {}
+        self.hashed = {}
+        if app is not None:
+            self.init_app(app)
+
+    def init_app(self, app):
+        app.config.setdefault('STATIC_FINGERPRINT', not app.debug)
+        app.config.setdefault('STATIC_BUILD_ON_STARTUP', True)
+        app.cli.add_command(build_assets)
+        if not app.config['STATIC_FINGERPRINT']:
+            return
+
+        manifest_path = os.path.join(app.static_folder, BUILD_DIR, MANIFEST)
+        if app.config['STATIC_BUILD_ON_STARTUP']:
+            # cheap when nothing changed: only files with a new hash are written
+            self.load(app.static_folder, build(app.static_folder))
+        elif os.path.exists(manifest_path):
+            with open(manifest_path) as f:
+                self.load(app.static_folder, json.load(f))
+        else:
+            app.logger.warning('%s not found; run `flask build-assets`', manifest_path)
+            return
+
+        app.url_defaults(self.hashed_url)
+        app.view_functions['static'] = self.send_static
+        app.extensions['static_assets'] = self
+
+    def load(self, static_folder, manifest):
+        self.manifest = manifest
+        # hashed path -> encodings with a precompressed variant, best first
+        self.hashed = dict(
+            (hashed, [encoding for encoding, suffix in ENCODINGS
+                      if os.path.exists(os.path.join(static_folder, hashed + suffix))])
+            for hashed in manifest.values())
+
+    def hashed_url(self, endpoint, values):
+        if endpoint == 'static' and 'filename' in values:
+            values['filename'] = self.manifest.get(values['filename'], values['filename'])
+
+    def send_static(self, filename):
+        encodings = self.hashed.get(filename)
+        if encodings is None:
+            return current_app.send_static_file(filename)
+
+        path = os.path.join(current_app.static_folder, filename)
+        # the type of the original file, not of its .gz/.br variant
+        mimetype = mimetypes.guess_type(filename)[0] or 'application/octet-stream'
+        encoding = next((encoding for encoding in encodings if request.accept_encodings[encoding]), None)
+        if encoding is not None:
+            path += dict(ENCODINGS)[encoding]
+        response = send_file(path, mimetype=mimetype, conditional=True, cache_timeout=YEAR)
+        if encoding is not None:
+            response.headers['Content-Encoding'] = encoding
+        response.vary.add('Accept-Encoding')
+        response.headers['Cache-Control'] = 'public, max-age=%d, immutable' % YEAR
+        return response
+
+
+@click.command('build-assets')
+@with_appcontext
+def build_assets():
+    """Write fingerprinted, precompressed copies of static/ to static/build/."""
+    manifest = build(current_app.static_folder)
+    click.echo('built %d assets in %s' % (len(manifest), os.path.join(current_app.static_folder, BUILD_DIR)))
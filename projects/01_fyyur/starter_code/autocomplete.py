@@ -0,0 +1,84 @@
+#----------------------------------------------------------------------------#
+# In-memory type-ahead over venue and artist names.
+#----------------------------------------------------------------------------#
+
+import threading
+from bisect import bisect_left, insort
+
+
+def _keys(name):
+    # "The Musical Hop" is found by "the m...", "musical..." and "hop..."
+    words = name.lower().split()
+    return [' '.join(words[i:]) for i in range(len(words))]
+
+
+class PrefixIndex(object):
+    """Names kept in a sorted array of (key, kind, id) so that every match for
+    a prefix is one contiguous run, found with a binary search.
+
+    kind is a short label such as 'venue' or 'artist'; ids are only unique
+    within a kind.
+    """
+
+    def __init__(self):
+        self._keys = []
+        self._names = {}
+        self._loaded = set()
+        self._lock = threading.Lock()
+
+    def __len__(self):
+        return len(self._names)
+
+    def loaded(self, kind):
+        return kind in self._loaded
+
+    def load(self, kind, rows):
+        """Replace every entry of kind with (id, name) rows."""
+        with self._lock:
+            self._names = dict((k, v) for k, v in self._names.items() if k[0] != kind)
+            for id, name in rows:
+                self._names[(kind, id)] = name
+            self._keys = sorted(
+                (key, entry_kind, entry_id)
+                for (entry_kind, entry_id), name in self._names.items()
+                for key in _keys(name))
+            self._loaded.add(kind)
+
+    def add(self, kind, id, name):
+        with self._lock:
+            self._remove(kind, id)
+            self._names[(kind, id)] = name
+            for key in _keys(name):
+                insort(self._keys, (key, kind, id))
+
+    def remove(self, kind, id):
+        with self._lock:
+            self._remove(kind, id)
+
+    def _remove(self, kind, id):
+        name = self._names.pop((kind, id), None)
+        if name is None:
+            return
+        for key in _keys(name):
+            i = bisect_left(self._keys, (key, kind, id))
+            if i < len(self._keys) and self._keys[i] == (key, kind, id):
+                del self._keys[i]
+
+    def complete(self, prefix, kind=None, limit=10):
+        """Up to limit (kind, id, name) entries with a word starting with prefix."""
+        prefix = ' '.join(prefix.lower().split())
+        if not prefix:
+            return []
+        results, seen = [], set()
+        with self._lock:
+            i = bisect_left(self._keys, (prefix,))
+            while i < len(self._keys) and len(results) < limit:
+                key, entry_kind, entry_id = self._keys[i]
+                if not key.startswith(prefix):
+                    break
+                i += 1
+                if (kind is not None and entry_kind != kind) or (entry_kind, entry_id) in seen:
+                    continue
+                seen.add((entry_kind, entry_id))
+                results.append((entry_kind, entry_id, self._names[(entry_kind, entry_id)]))
+        return results
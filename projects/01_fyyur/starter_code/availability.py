@@ -0,0 +1,136 @@
+#----------------------------------------------------------------------------#
+# Venue bookings held in memory for free-venue lookups and venue schedules.
+# Double bookings are checked against the database (app.venue_conflicts),
+# under an advisory lock on the venue.
+#----------------------------------------------------------------------------#
+
+import threading
+import zlib
+from bisect import bisect_left, insort
+
+# first key of the transaction advisory lock taken on a venue while booking
+# it, pg_advisory_xact_lock(BOOKING_LOCK_NAMESPACE, venue_id); the two-key
+# form keeps it apart from other users of advisory locks
+BOOKING_LOCK_NAMESPACE = zlib.crc32(b'fyyur.venue_bookings') & 0x7fffffff
+
+
+class BookingIndex(object):
+    """Every show booking as the interval [start_time, start_time + duration).
+
+    Shows have no end time, so all intervals share one length. That turns the
+    interval tree into two sorted arrays of start times, one per venue and one
+    across all venues: a window [start, end) overlaps exactly the bookings
+    that start in (start - duration, end), a contiguous run found by binary
+    search. Lookups are O(log n + matches); adds and removes are a bisect
+    plus a list shift.
+
+    Only bookings starting at or after `since` are held. Windows reaching
+    further back than that have to be answered from the database; covers()
+    says whether the index can answer a window.
+
+    A load that races with a change is thrown away instead of being kept,
+    as the change may or may not be in it.
+    """
+
+    def __init__(self, duration):
+        self.duration = duration
+        self.since = None
+        self._by_venue = {}  # venue_id -> sorted [(start_time, show_id)]
+        self._all = []  # sorted [(start_time, venue_id, show_id)]
+        self._shows = {}  # show_id -> (start_time, venue_id)
+        self._generation = 0
+        self._lock = threading.RLock()
+
+    @property
+    def loaded(self):
+        return self.since is not None
+
+    def load(self, since, loader):
+        """Replace the index with the (show_id, venue_id, start_time) rows
+        loader() returns, unless a change arrived meanwhile; returns whether
+        the index was loaded."""
+        generation = self._generation
+        shows = dict((id, (start, venue_id)) for id, venue_id, start in loader()
+                     if start is not None and start >= since)
+        by_start = sorted((start, venue_id, id) for id, (start, venue_id) in shows.items())
+        by_venue = {}
+        for start, venue_id, id in by_start:
+            by_venue.setdefault(venue_id, []).append((start, id))
+        with self._lock:
+            if generation != self._generation:
+                return False
+            self.since = since
+            self._shows, self._all, self._by_venue = shows, by_start, by_venue
+            return True
+
+    def reset(self):
+        with self._lock:
+            self._generation += 1
+            self.since = None
+            self._by_venue, self._all, self._shows = {}, [], {}
+
+    def covers(self, start):
+        return self.loaded and start - self.duration >= self.since
+
+    def add(self, show_id, venue_id, start):
+        with self._lock:
+            self._generation += 1
+            if not self.loaded or start is None or start < self.since:
+                return
+            self._remove(show_id)
+            self._shows[show_id] = (start, venue_id)
+            insort(self._all, (start, venue_id, show_id))
+            insort(self._by_venue.setdefault(venue_id, []), (start, show_id))
+
+    def remove(self, show_id):
+        with self._lock:
+            self._generation += 1
+            self._remove(show_id)
+
+    def _remove(self, show_id):
+        booking = self._shows.pop(show_id, None)
+        if booking is None:
+            return
+        start, venue_id = booking
+        _discard(self._all, (start, venue_id, show_id))
+        _discard(self._by_venue.get(venue_id, []), (start, show_id))
+
+    def remove_venue(self, venue_id):
+        with self._lock:
+            self._generation += 1
+            for start, show_id in self._by_venue.pop(venue_id, []):
+                self._shows.pop(show_id, None)
+                _discard(self._all, (start, venue_id, show_id))
+
+    def bookings(self, venue_id, start, end):
+        """(start_time, show_id) of the venue's shows overlapping [start, end)."""
+        with self._lock:
+            bookings = self._by_venue.get(venue_id, [])
+            i = bisect_left(bookings, (start - self.duration,))
+            j = bisect_left(bookings, (end,))
+            return [b for b in bookings[i:j] if b[0] > start - self.duration]
+
+    def last_started(self, now):
+        """Start time of the latest held booking at or before now, or None."""
+        with self._lock:
+            i = bisect_left(self._all, (now,))
+            while i < len(self._all) and self._all[i][0] <= now:
+                i += 1
+            return self._all[i - 1][0] if i else None
+
+    def booked_venues(self, start, end):
+        """Ids of every venue with a show overlapping [start, end)."""
+        with self._lock:
+            i = bisect_left(self._all, (start - self.duration,))
+            booked = set()
+            while i < len(self._all) and self._all[i][0] < end:
+                if self._all[i][0] > start - self.duration:
+                    booked.add(self._all[i][1])
+                i += 1
+            return booked
+
+
+def _discard(items, item):
+    i = bisect_left(items, item)
+    if i < len(items) and items[i] == item:
+        del items[i]
@@ -0,0 +1,191 @@
+#----------------------------------------------------------------------------#
+# Batched, resumable data migrations.
+#
+# Alembic runs a whole upgrade in one transaction, so a revision that
+# rewrites every row of a big table holds its locks until the last row is
+# done. backfill() instead commits the migration so far and updates the table
+# in short transactions over consecutive key ranges, each of which records
+# its progress in the backfill_checkpoint table: if the upgrade dies, running
+# it again carries on after the last committed batch.
+#
+# Adding a column with a computed value then takes three revisions:
+#
+#   1. op.add_column(...) with the column nullable and no server_default
+#      that needs computing per row: only a catalog change.
+#   2. backfill('venue_slug', 'Venue', "slug = lower(name)", where="slug IS NULL")
+#      in its own revision, so that a rerun starts there; downgrade() calls
+#      forget('venue_slug').
+#   3. set_not_null('Venue', 'slug'), if the column must not be null.
+#
+# Meanwhile the application must already write the new column itself.
+#----------------------------------------------------------------------------#
+
+import logging
+import time
+
+from alembic import op
+from sqlalchemy import text
+from sqlalchemy.exc import DBAPIError
+
+# under alembic's logger, so that progress shows with `flask db upgrade`
+log = logging.getLogger('alembic.backfill')
+
+CHECKPOINT_TABLE = 'backfill_checkpoint'
+
+# lock_not_available (lock_timeout), deadlock_detected, serialization_failure
+RETRYABLE = ('55P03', '40P01', '40001')
+
+_CREATE_CHECKPOINTS = """
+CREATE TABLE IF NOT EXISTS backfill_checkpoint (
+    name varchar(128) PRIMARY KEY,
+    last_key bigint NOT NULL,
+    rows bigint NOT NULL DEFAULT 0,
+    started_at timestamp NOT NULL DEFAULT now(),
+    updated_at timestamp NOT NULL DEFAULT now(),
+    finished_at timestamp
+)
+"""
+
+
+class Backfill(object):
+    """Runs `UPDATE table SET assignments WHERE where` in batches of
+    consecutive keys, on a connection of its own.
+
+    Batches are resized toward target_seconds each, between min_batch and
+    max_batch rows, with a pause between them to leave the database to the
+    site. A batch that times out waiting for a lock or deadlocks is retried
+    with half as many rows, up to retries times in a row.
+    """
+
+    def __init__(self, name, table, assignments, where=None, key='id',
+                 batch_size=1000, min_batch=100, max_batch=10000, target_seconds=0.5,
+                 pause=0.1, lock_timeout='2s', retries=5):
+        self.name = name
+        self.table = table
+        self.assignments = assignments
+        self.where = where
+        self.key = key
+        self.batch_size = batch_size
+        self.min_batch = min_batch
+        self.max_batch = max_batch
+        self.target_seconds = target_seconds
+        self.pause = pause
+        self.lock_timeout = lock_timeout
+        self.retries = retries
+
+    def statements(self, dialect):
+        quote = dialect.identifier_preparer.quote
+        table, key = quote(self.table), quote(self.key)
+        where = ' AND (%s)' % self.where if self.where else ''
+        first = text('SELECT coalesce(min(%s), 1) - 1 FROM %s' % (key, table))
+        bound = text('SELECT max(%(key)s) FROM (SELECT %(key)s FROM %(table)s WHERE %(key)s > :low '
+                     'ORDER BY %(key)s LIMIT :size) batch' % {'key': key, 'table': table})
+        update = text('UPDATE %s SET %s WHERE %s > :low AND %s <= :high%s'
+                      % (table, self.assignments, key, key, where))
+        return first, bound, update
+
+    def run(self, connection):
+        """Run (or resume) the backfill; returns the number of rows updated
+        by this run."""
+        first, bound, update = self.statements(connection.dialect)
+        connection.execute(text(_CREATE_CHECKPOINTS))
+        checkpoint = connection.execute(
+            text('SELECT last_key, rows, finished_at FROM backfill_checkpoint WHERE name = :name'),
+            name=self.name).first()
+        if checkpoint is None:
+            low, total = connection.execute(first).scalar(), 0
+            connection.execute(text('INSERT INTO backfill_checkpoint (name, last_key) VALUES (:name, :low)'),
+                               name=self.name, low=low)
+        elif checkpoint.finished_at is not None:
+            log.info('backfill %s: already finished at %s', self.name, checkpoint.finished_at)
+            return 0
+        else:
+            low, total = checkpoint.last_key, checkpoint.rows
+            log.info('backfill %s: resuming after %s %s (%d rows done)', self.name, self.key, low, total)
+
+        size, failures, updated = self.batch_size, 0, 0
+        while True:
+            started = time.monotonic()
+            try:
+                with connection.begin():
+                    connection.execute(text("SELECT set_config('lock_timeout', :timeout, true)"),
+                                       timeout=self.lock_timeout)
+                    high = connection.execute(bound, low=low, size=size).scalar()
+                    if high is None:
+                        break
+                    rows = connection.execute(update, low=low, high=high).rowcount
+                    connection.execute(
+                        text('UPDATE backfill_checkpoint SET last_key = :high, rows = rows + :rows, '
+                             'updated_at = now() WHERE name = :name'),
+                        high=high, rows=rows, name=self.name)
+            except DBAPIError as e:
+                failures += 1
+                if getattr(e.orig, 'pgcode', None) not in RETRYABLE or failures > self.retries:
+                    raise
+                size = max(self.min_batch, size // 2)
+                log.warning('backfill %s: %s; retrying with %d rows', self.name, e.orig, size)
+                time.sleep(self.pause * 2 ** failures)
+                continue
+
+            elapsed = time.monotonic() - started
+            failures = 0
+            low, total, updated = high, total + rows, updated + rows
+            log.info('backfill %s: %s <= %s, %d rows in %.2fs (%d total)',
+                     self.name, self.key, high, rows, elapsed, total)
+            size = int(min(self.max_batch, max(self.min_batch, size * self.target_seconds / max(elapsed, 0.001))))
+            time.sleep(self.pause)
+
+        connection.execute(text('UPDATE backfill_checkpoint SET finished_at = now() WHERE name = :name'),
+                           name=self.name)
+        log.info('backfill %s: finished, %d rows updated', self.name, total)
+        return updated
+
+
+def backfill(name, table, assignments, where=None, **options):
+    """Backfill from an Alembic revision's upgrade(); see Backfill.
+
+    name identifies the checkpoint, so it must be unique across revisions.
+    assignments and where are SQL, e.g. "slug = lower(name)" and
+    "slug IS NULL"; where should exclude rows already done, so that a batch
+    redone after a crash changes nothing. Commits whatever the migration did
+    before. In offline (--sql) mode, emits a single UPDATE instead.
+    """
+    migration = op.get_context()
+    job = Backfill(name, table, assignments, where, **options)
+    if migration.as_sql:
+        quote = migration.dialect.identifier_preparer.quote
+        op.execute('UPDATE %s SET %s%s' % (quote(table), assignments, ' WHERE %s' % where if where else ''))
+        return
+    with migration.autocommit_block():
+        # a connection of its own, so that each batch is its own transaction
+        with op.get_bind().engine.connect() as connection:
+            job.run(connection)
+
+
+def forget(name):
+    """Drop a backfill's checkpoint, from the revision's downgrade(), so that
+    upgrading again starts over."""
+    op.execute(text("DO $$ BEGIN IF to_regclass('backfill_checkpoint') IS NOT NULL THEN "
+                    "DELETE FROM backfill_checkpoint WHERE name = '%s'; END IF; END $$"
+                    % name.replace("'", "''")))
+
+
+def set_not_null(table, column, lock_timeout='2s'):
+    """Make a backfilled column NOT NULL without blocking writes while the
+    table is scanned.
+
+    A NOT VALID check constraint is added and then validated, which scans
+    the table without blocking writes; with it in place, Postgres 12+ sets
+    NOT NULL without scanning again. Each step commits on its own and gives
+    up after lock_timeout waiting for its lock.
+    """
+    constraint = 'ck_%s_%s_not_null' % (table, column)
+    quote = op.get_context().dialect.identifier_preparer.quote
+    with op.get_context().autocommit_block():
+        op.execute(text("SELECT set_config('lock_timeout', :timeout, false)").bindparams(timeout=lock_timeout))
+        op.execute('ALTER TABLE %s ADD CONSTRAINT %s CHECK (%s IS NOT NULL) NOT VALID'
+                   % (quote(table), quote(constraint), quote(column)))
+        op.execute('ALTER TABLE %s VALIDATE CONSTRAINT %s' % (quote(table), quote(constraint)))
+        op.alter_column(table, column, nullable=False)
+        op.drop_constraint(constraint, table)
+        op.execute('RESET lock_timeout')
@@ -0,0 +1,262 @@
+#----------------------------------------------------------------------------#
+# Synthetic data and a route-level benchmark.
+#
+#   flask bench seed --shows 100000 --truncate
+#   flask bench run --requests 200 --save baseline.json
+#   flask bench run --compare baseline.json
+#
+# `seed` generates venues, artists and shows (names are deterministic, so
+# re-seeding tops up rather than duplicating) and loads them through the
+# bulk-import helpers. `run` drives each page through the Flask test client,
+# reports p50/p95/p99 latency and SQL statements per request, and can save
+# the numbers as a JSON baseline or diff them against one.
+#----------------------------------------------------------------------------#
+
+import json
+import math
+import platform
+import random
+import time
+from datetime import datetime, timedelta
+
+import click
+from flask import current_app
+from flask.cli import AppGroup
+
+import stats
+from cache import Change, publish
+from importer import (VENUE_COLUMNS, ARTIST_COLUMNS, NameResolver, batches,
+                      insert_entities, copy_shows)
+from models import db, Venue, Artist, Show
+
+bench = AppGroup('bench', help='Seed synthetic data and benchmark the pages.')
+
+CITIES = (('San Francisco', 'CA'), ('New York', 'NY'), ('Austin', 'TX'), ('Seattle', 'WA'),
+          ('Chicago', 'IL'), ('Nashville', 'TN'), ('New Orleans', 'LA'), ('Denver', 'CO'))
+GENRES = ('Alternative', 'Blues', 'Classical', 'Country', 'Electronic', 'Folk', 'Funk',
+          'Hip-Hop', 'Jazz', 'Pop', 'Punk', 'R&B', 'Reggae', 'Rock n Roll', 'Soul')
+WORDS = ('Musical', 'Hop', 'Dueling', 'Pianos', 'Park', 'Square', 'Live', 'Music', 'Coffee',
+         'Guns', 'Petty', 'Matt', 'Quevado', 'Wild', 'Sax', 'Band', 'Blue', 'Moon', 'Hall', 'Club')
+
+# pages `run` can drive, in the order they are measured
+ROUTES = ('venues', 'search_venues', 'show_venue', 'artists', 'show_artist', 'shows')
+
+
+#----------------------------------------------------------------------------#
+# Seeding.
+#----------------------------------------------------------------------------#
+
+def _name(rng, kind, i):
+    # unique via the number, searchable via the words
+    return '%s %s %s %06d' % (rng.choice(WORDS), rng.choice(WORDS), kind, i)
+
+
+def venue_records(count, rng):
+    for i in range(count):
+        city, state = rng.choice(CITIES)
+        yield {
+            'name': _name(rng, 'Venue', i), 'city': city, 'state': state,
+            'address': '%d Main St' % rng.randint(1, 9999), 'phone': '555-555-%04d' % (i % 10000),
+            'genres': rng.sample(GENRES, rng.randint(1, 3)),
+            'image_link': 'https://picsum.photos/seed/venue%d/300' % i,
+            'seeking_talent': rng.random() < 0.5,
+        }
+
+
+def artist_records(count, rng):
+    for i in range(count):
+        city, state = rng.choice(CITIES)
+        yield {
+            'name': _name(rng, 'Artist', i), 'city': city, 'state': state,
+            'phone': '555-555-%04d' % (i % 10000), 'genres': rng.sample(GENRES, rng.randint(1, 3)),
+            'image_link': 'https://picsum.photos/seed/artist%d/300' % i,
+            'seeking_venue': rng.random() < 0.5,
+        }
+
+
+def show_records(count, venue_ids, artist_ids, rng, days=365):
+    # spread over [now - days, now + days), on the hour
+    now = datetime.now().replace(minute=0, second=0, microsecond=0)
+    for _ in range(count):
+        yield {
+            'venue_id': rng.choice(venue_ids),
+            'artist_id': rng.choice(artist_ids),
+            'start_time': now + timedelta(hours=rng.randrange(-24 * days, 24 * days)),
+        }
+
+
+@bench.command('seed')
+@click.option('--shows', default=10000, show_default=True, help='Number of shows to add.')
+@click.option('--venues', type=int, help='Number of venues [default: shows / 50, at least 10].')
+@click.option('--artists', type=int, help='Number of artists [default: shows / 20, at least 10].')
+@click.option('--seed', 'random_seed', default=1, show_default=True, help='Random seed.')
+@click.option('--truncate', is_flag=True, help='Empty the Show, Venue and Artist tables first.')
+@click.option('--batch-size', default=20000, show_default=True, help='Rows per INSERT/COPY.')
+def seed(shows, venues, artists, random_seed, truncate, batch_size):
+    """Fill the database with synthetic venues, artists and shows."""
+    rng = random.Random(random_seed)
+    venues = venues if venues is not None else max(10, shows // 50)
+    artists = artists if artists is not None else max(10, shows // 20)
+    started = time.time()
+    cursor = db.session.connection().connection.cursor()
+    try:
+        if truncate:
+            cursor.execute('TRUNCATE "Show", "Venue", "Artist" RESTART IDENTITY CASCADE')
+        for batch in batches(venue_records(venues, rng), batch_size):
+            insert_entities(cursor, Venue, VENUE_COLUMNS, batch)
+        for batch in batches(artist_records(artists, rng), batch_size):
+            insert_entities(cursor, Artist, ARTIST_COLUMNS, batch)
+        resolve_venue, resolve_artist = NameResolver(Venue, 'venue'), NameResolver(Artist, 'artist')
+        venue_ids, artist_ids = sorted(resolve_venue.known), sorted(resolve_artist.known)
+        added = 0
+        for batch in batches(show_records(shows, venue_ids, artist_ids, rng), batch_size):
+            added += copy_shows(cursor, batch, resolve_artist, resolve_venue)[0]
+            click.echo('shows: %d/%d' % (added, shows))
+        stats.rebuild(datetime.now())
+        db.session.commit()
+    except Exception:
+        db.session.rollback()
+        raise
+    publish([Change('bulk', model, {}, {}) for model in (Venue, Artist, Show)])
+    click.echo('seeded %d venues, %d artists, %d shows in %.1fs' % (
+        len(venue_ids), len(artist_ids), added, time.time() - started))
+
+
+#----------------------------------------------------------------------------#
+# Benchmark.
+#----------------------------------------------------------------------------#
+
+def percentile(values, p):
+    """Nearest-rank percentile of a sorted list."""
+    if not values:
+        return None
+    rank = max(1, int(math.ceil(p / 100.0 * len(values))))
+    return values[rank - 1]
+
+
+def _requests(route, rng, venue_ids, artist_ids):
+    """An endless stream of (method, url, form) for route."""
+    while True:
+        if route == 'venues':
+            yield 'GET', '/venues', None
+        elif route == 'search_venues':
+            yield 'POST', '/venues/search', {'search_term': rng.choice(WORDS).lower()}
+        elif route == 'show_venue':
+            yield 'GET', '/venues/%d' % rng.choice(venue_ids), None
+        elif route == 'artists':
+            # the first page, or a jump to a letter
+            yield 'GET', '/artists?from=%s' % rng.choice(['', 'A', 'F', 'M', 'S', 'W']), None
+        elif route == 'show_artist':
+            yield 'GET', '/artists/%d' % rng.choice(artist_ids), None
+        elif route == 'shows':
+            yield 'GET', '/shows', None
+
+
+def measure(client, reports, route, count, warmup, rng, venue_ids, artist_ids):
+    """Time route; reports receives each request's querystats.RequestStats."""
+    requests = _requests(route, rng, venue_ids, artist_ids)
+    timings, statements = [], []
+    for i in range(warmup + count):
+        method, url, form = next(requests)
+        del reports[:]
+        started = time.perf_counter()
+        response = client.open(url, method=method, data=form)
+        response.get_data()  # drains streamed bodies
+        response.close()
+        elapsed = time.perf_counter() - started
+        if response.status_code >= 400:
+            raise click.ClickException('%s %s returned %d' % (method, url, response.status_code))
+        if i >= warmup:
+            timings.append(elapsed * 1000)
+            statements.append(sum(stats.count for stats in reports))
+    timings.sort()
+    return {
+        'requests': count,
+        'p50_ms': round(percentile(timings, 50), 3),
+        'p95_ms': round(percentile(timings, 95), 3),
+        'p99_ms': round(percentile(timings, 99), 3),
+        'mean_ms': round(sum(timings) / len(timings), 3),
+        'queries_per_request': round(sum(statements) / float(len(statements)), 2),
+        'max_queries': max(statements),
+    }
+
+
+def compare(baseline, results, threshold):
+    """Print each metric's change from baseline; return the regressions."""
+    regressions = []
+    click.echo('%-14s %-20s %10s %10s %8s' % ('route', 'metric', 'baseline', 'now', 'change'))
+    for route, now in results.items():
+        before = baseline['routes'].get(route)
+        if before is None:
+            continue
+        for metric in ('p50_ms', 'p95_ms', 'p99_ms', 'queries_per_request'):
+            old, new = before[metric], now[metric]
+            change = (new - old) / old * 100 if old else 0.0
+            worse = new > old if metric == 'queries_per_request' else change > threshold
+            click.echo('%-14s %-20s %10.2f %10.2f %+7.1f%%%s' % (
+                route, metric, old, new, change, '  REGRESSION' if worse else ''))
+            if worse:
+                regressions.append((route, metric))
+    return regressions
+
+
+@bench.command('run')
+@click.option('--route', 'routes', multiple=True, type=click.Choice(ROUTES),
+              help='Route to benchmark; repeatable [default: all].')
+@click.option('--requests', 'count', default=200, show_default=True, help='Measured requests per route.')
+@click.option('--warmup', default=20, show_default=True, help='Unmeasured requests per route first.')
+@click.option('--seed', 'random_seed', default=1, show_default=True, help='Random seed for ids and terms.')
+@click.option('--save', type=click.Path(dir_okay=False), help='Write the results to this JSON file.')
+@click.option('--compare', 'baseline_path', type=click.Path(exists=True, dir_okay=False),
+              help='Diff against a saved baseline; exits 1 on a regression.')
+@click.option('--threshold', default=20.0, show_default=True,
+              help='Latency increase (percent) reported as a regression.')
+def run(routes, count, warmup, random_seed, save, baseline_path, threshold):
+    """Time each page and count its SQL statements."""
+    app = current_app._get_current_object()
+    rng = random.Random(random_seed)
+    venue_ids = [id for id, in db.session.query(Venue.id)]
+    artist_ids = [id for id, in db.session.query(Artist.id)]
+    if not venue_ids or not artist_ids:
+        raise click.ClickException('no venues or artists; run `flask bench seed` first')
+    sizes = {
+        'venues': len(venue_ids),
+        'artists': len(artist_ids),
+        'shows': db.session.query(db.func.count(Show.id)).scalar(),
+    }
+    db.session.remove()
+
+    level = app.logger.level
+    app.logger.setLevel('WARNING')  # keep the per-request query log quiet
+    # the statements each request ran, as counted by querystats
+    query_stats = app.extensions['query_stats']
+    reports = []
+    query_stats.observe(reports.append)
+    results = {}
+    try:
+        client = app.test_client()
+        for route in routes or ROUTES:
+            results[route] = measure(client, reports, route, count, warmup, rng, venue_ids, artist_ids)
+            click.echo('%-14s p50 %8.2fms  p95 %8.2fms  p99 %8.2fms  %6.2f queries/request' % (
+                route, results[route]['p50_ms'], results[route]['p95_ms'],
+                results[route]['p99_ms'], results[route]['queries_per_request']))
+    finally:
+        query_stats.unobserve(reports.append)
+        app.logger.setLevel(level)
+
+    if save:
+        with open(save, 'w') as f:
+            json.dump({
+                'created': datetime.now().isoformat(timespec='seconds'),
+                'python': platform.python_version(),
+                'sizes': sizes,
+                'routes': results,
+            }, f, indent=2, sort_keys=True)
+        click.echo('saved %s' % save)
+    if baseline_path:
+        with open(baseline_path) as f:
+            baseline = json.load(f)
+        if baseline.get('sizes') != sizes:
+            click.echo('warning: baseline was taken at %s, now %s' % (baseline.get('sizes'), sizes))
+        if compare(baseline, results, threshold):
+            raise SystemExit(1)
@@ -0,0 +1,137 @@
+#----------------------------------------------------------------------------#
+# In-process caches for the read-heavy pages, and the commit hook that
+# keeps them honest.
+#----------------------------------------------------------------------------#
+
+import logging
+import threading
+from collections import OrderedDict, namedtuple
+from datetime import datetime
+
+from flask import current_app, has_app_context
+from sqlalchemy import event, inspect
+from sqlalchemy.orm import Session
+from sqlalchemy.orm.attributes import get_history
+
+# One committed row change. `values` holds the row's column values as they
+# were flushed; for updates `previous` holds the old value of every column
+# that changed. Set-based writes that bypass the ORM (bulk imports) publish
+# op 'bulk' with empty values: any row of `model` may have changed.
+Change = namedtuple('Change', 'op model values previous')
+
+_subscribers = []
+
+
+def on_commit(fn):
+    """Register fn(changes) to be called after every successful commit."""
+    _subscribers.append(fn)
+    return fn
+
+
+def publish(changes):
+    # runs after the commit: a failing subscriber must neither make the
+    # write look failed nor keep the others from hearing of it
+    for fn in _subscribers:
+        try:
+            fn(changes)
+        except Exception:
+            logger = current_app.logger if has_app_context() else logging.getLogger(__name__)
+            logger.exception('commit subscriber %s failed', getattr(fn, '__name__', fn))
+
+
+def _snapshot(obj):
+    state = inspect(obj)
+    return dict((attr.key, state.dict.get(attr.key)) for attr in state.mapper.column_attrs)
+
+
+def _previous(obj):
+    state = inspect(obj)
+    previous = {}
+    for attr in state.mapper.column_attrs:
+        history = get_history(obj, attr.key, passive=True)
+        if history.added and history.deleted:
+            previous[attr.key] = history.deleted[0]
+    return previous
+
+
+@event.listens_for(Session, 'after_flush')
+def _collect_changes(session, flush_context):
+    pending = session.info.setdefault('fyyur_changes', [])
+    for obj in session.new:
+        pending.append(Change('insert', type(obj), _snapshot(obj), {}))
+    for obj in session.dirty:
+        if session.is_modified(obj, include_collections=False):
+            pending.append(Change('update', type(obj), _snapshot(obj), _previous(obj)))
+    for obj in session.deleted:
+        pending.append(Change('delete', type(obj), _snapshot(obj), {}))
+
+
+@event.listens_for(Session, 'after_commit')
+def _publish_changes(session):
+    changes = session.info.pop('fyyur_changes', None)
+    if changes:
+        publish(changes)
+
+
+@event.listens_for(Session, 'after_rollback')
+def _discard_changes(session):
+    session.info.pop('fyyur_changes', None)
+
+
+class ExpiringCache(object):
+    """A small thread-safe LRU whose entries can also expire at a set time.
+
+    Entries are filled through get_or_load(); a load that races with an
+    invalidation is thrown away instead of being cached.
+    """
+
+    def __init__(self, maxsize=1024):
+        self.maxsize = maxsize
+        self._entries = OrderedDict()
+        self._generation = 0
+        self._lock = threading.Lock()
+
+    def get(self, key, default=None):
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is None:
+                return default
+            value, expires = entry
+            if expires is not None and datetime.now() >= expires:
+                del self._entries[key]
+                return default
+            self._entries.move_to_end(key)
+            return value
+
+    def get_or_load(self, key, loader):
+        """Return the cached value for key, calling loader() on a miss.
+
+        loader returns a (value, expires) pair; expires may be None. A None
+        value (nothing found) is returned but not cached, so that lookups of
+        made-up keys can't push out real entries.
+        """
+        missing = object()
+        value = self.get(key, missing)
+        if value is not missing:
+            return value
+        generation = self._generation
+        value, expires = loader()
+        if value is None:
+            return value
+        with self._lock:
+            if generation == self._generation:
+                self._entries[key] = (value, expires)
+                self._entries.move_to_end(key)
+                while len(self._entries) > self.maxsize:
+                    self._entries.popitem(last=False)
+        return value
+
+    def invalidate(self, key):
+        with self._lock:
+            self._generation += 1
+            self._entries.pop(key, None)
+
+    def clear(self):
+        with self._lock:
+            self._generation += 1
+            self._entries.clear()
@@ -0,0 +1,146 @@
+#----------------------------------------------------------------------------#
+# Cross-process change feed.
+#
+# The caches and indexes in app.py live in one process and are kept current
+# by cache.on_commit subscribers, which only see that process's commits.
+# With several worker processes, ChangeFeed relays every published change
+# batch to the others through Postgres NOTIFY on CHANGE_FEED_CHANNEL; each
+# worker LISTENs on its own connection and replays what the others publish
+# to its own subscribers.
+#----------------------------------------------------------------------------#
+
+import json
+import os
+import select
+import threading
+import uuid
+from datetime import date, datetime
+
+import psycopg2
+from sqlalchemy import text
+
+from cache import Change, on_commit, publish
+
+# NOTIFY payloads must stay under 8000 bytes
+MAX_PAYLOAD = 7900
+
+
+def _encode(value):
+    if isinstance(value, datetime):
+        return {'$datetime': value.isoformat()}
+    if isinstance(value, date):
+        return {'$date': value.isoformat()}
+    raise TypeError('cannot encode %r' % (value,))
+
+
+def _decode(value):
+    if '$datetime' in value:
+        return datetime.fromisoformat(value['$datetime'])
+    if '$date' in value:
+        return date.fromisoformat(value['$date'])
+    return value
+
+
+class ChangeFeed(object):
+
+    def __init__(self, app, db, models):
+        self.app = app
+        self.db = db
+        # table name -> model, to map received changes back to models
+        self.models = dict((model.__tablename__, model) for model in models)
+        self.sender = '%d:%s' % (os.getpid(), uuid.uuid4().hex)
+        self.channel = app.config['CHANGE_FEED_CHANNEL']
+        self._replaying = threading.local()
+        self._thread = None
+        on_commit(self.broadcast)
+        app.extensions['change_feed'] = self
+
+    @property
+    def running(self):
+        return self._thread is not None and self._thread.is_alive()
+
+    def encode(self, changes):
+        payload = json.dumps({
+            'sender': self.sender,
+            'changes': [(c.op, c.model.__tablename__, c.values, c.previous) for c in changes],
+        }, default=_encode)
+        if len(payload) > MAX_PAYLOAD:
+            # too big for one notification: have the others drop everything
+            # they hold for the tables involved instead
+            tables = sorted(set(c.model.__tablename__ for c in changes))
+            payload = json.dumps({
+                'sender': self.sender,
+                'changes': [('bulk', table, {}, {}) for table in tables],
+            })
+        return payload
+
+    def decode(self, payload):
+        message = json.loads(payload, object_hook=_decode)
+        if message['sender'] == self.sender:
+            return []
+        return [Change(op, self.models[table], values, previous)
+                for op, table, values, previous in message['changes']
+                if table in self.models]
+
+    def broadcast(self, changes):
+        # sent from every process, CLI commands included, whether or not it
+        # listens itself
+        if getattr(self._replaying, 'active', False):
+            return
+        with self.db.get_engine(self.app).connect() as connection:
+            connection.execution_options(autocommit=True).execute(
+                text('SELECT pg_notify(:channel, :payload)'),
+                channel=self.channel, payload=self.encode(changes))
+
+    def replay(self, changes):
+        self._replaying.active = True
+        try:
+            with self.app.app_context():
+                publish(changes)
+        finally:
+            self._replaying.active = False
+
+    def start(self):
+        """Start listening in a daemon thread; call once per worker process,
+        after it has been forked."""
+        if self.running:
+            return
+        self.sender = '%d:%s' % (os.getpid(), uuid.uuid4().hex)
+        self._thread = threading.Thread(target=self._listen, name='change-feed', daemon=True)
+        self._thread.start()
+
+    def _connect(self):
+        url = self.db.get_engine(self.app).url
+        connection = psycopg2.connect(**url.translate_connect_args(username='user', database='dbname'),
+                                      **url.query)
+        connection.autocommit = True
+        connection.cursor().execute('LISTEN "%s"' % self.channel)
+        return connection
+
+    def _listen(self):
+        connection = None
+        reconnecting = False
+        while True:
+            try:
+                if connection is None:
+                    connection = self._connect()
+                    if reconnecting:
+                        # whatever was sent while not listening is lost
+                        self.replay([Change('bulk', model, {}, {}) for model in self.models.values()])
+                if select.select([connection], [], [], 60) == ([], [], []):
+                    continue
+                connection.poll()
+                while connection.notifies:
+                    changes = self.decode(connection.notifies.pop(0).payload)
+                    if changes:
+                        self.replay(changes)
+            except Exception:
+                self.app.logger.exception('change feed: reconnecting')
+                if connection is not None:
+                    try:
+                        connection.close()
+                    except Exception:
+                        pass
+                connection = None
+                reconnecting = True
+                threading.Event().wait(1)
@@ -0,0 +1,113 @@
+#----------------------------------------------------------------------------#
+# Conditional GET for the HTML pages.
+#
+# Every page's content is a function of a few tables (plus, for pages that
+# split shows into past and upcoming, the clock). Each table has a version in
+# the database, bumped by a trigger on every write (the table_version table);
+# VersionCounters mirrors them in memory, and @conditional derives the page's
+# ETag/Last-Modified from those versions and answers a matching
+# If-None-Match/If-Modified-Since with 304 before the view runs any SQL.
+# Since the versions are shared, a validator issued by one worker process
+# matches on every other.
+# Only pages read from the primary get validators: the versions are bumped
+# as the primary commits, ahead of what a replica may have replayed.
+#----------------------------------------------------------------------------#
+
+import hashlib
+import math
+import threading
+import time
+from datetime import datetime, timezone
+from functools import wraps
+
+from flask import request, session, make_response, Response
+
+from routing import served_from_replica
+
+
+class VersionCounters(object):
+    """The tables' versions, as loaded by loader(): (table, version) rows,
+    where a version is the time of the table's last write in microseconds
+    since the epoch (or just after the previous version).
+
+    Loaded on first use; refresh() after every commit, this process's or
+    another's, picks up the new versions.
+    """
+
+    def __init__(self, loader):
+        self.loader = loader
+        self._versions = None
+        self._lock = threading.Lock()
+
+    def refresh(self):
+        rows = self.loader()
+        with self._lock:
+            versions = dict(self._versions or {})
+            for table, version in rows:
+                # a refresh that overtook this one may have seen newer ones
+                versions[table] = max(version, versions.get(table, 0))
+            self._versions = versions
+
+    def version(self, table):
+        if self._versions is None:
+            self.refresh()
+        return self._versions.get(table, 0)
+
+    def modified(self, table):
+        return self.version(table) / 1e6
+
+
+def _timestamp(value):
+    if value.tzinfo is None:
+        value = value.replace(tzinfo=timezone.utc)
+    return value.timestamp()
+
+
+def conditional(versions, tables, clock=None):
+    """Decorate a GET view whose output depends only on `tables`, the URL
+    and, if given, clock(): a callable returning the last moment at which
+    the page's content changed on its own (e.g. a show became past), or None.
+    """
+    def decorator(view):
+        @wraps(view)
+        def wrapper(*args, **kwargs):
+            # a pending flash message isn't covered by the validators
+            if request.method not in ('GET', 'HEAD') or session.get('_flashes'):
+                return view(*args, **kwargs)
+
+            state = [request.full_path]
+            state.extend(versions.version(table) for table in tables)
+            changed = max(versions.modified(table) for table in tables)
+            if clock is not None:
+                moment = clock()
+                if moment is not None:
+                    state.append(moment.isoformat())
+                    changed = max(changed, moment.timestamp())
+            etag = hashlib.sha1(repr(state).encode()).hexdigest()
+            # HTTP dates have whole seconds: round up, so that a write later
+            # in the same second still counts as a change since then
+            changed = math.ceil(changed)
+
+            if request.if_none_match:
+                not_modified = request.if_none_match.contains_weak(etag)
+            else:
+                since = request.if_modified_since
+                not_modified = since is not None and _timestamp(since) >= changed
+            if not_modified:
+                response = Response(status=304)
+            else:
+                response = make_response(view(*args, **kwargs))
+                response.cache_control.no_cache = True
+                if served_from_replica(streamed=response.is_streamed):
+                    # the versions are the primary's; a lagging replica's
+                    # content under them would be revalidated as current
+                    # until the next write
+                    return response
+            response.set_etag(etag, weak=True)
+            if changed <= time.time():
+                # until its second is over, another write could still land
+                # in it unseen by If-Modified-Since; the ETag covers that
+                response.last_modified = datetime.fromtimestamp(changed, timezone.utc)
+            return response
+        return wrapper
+    return decorator
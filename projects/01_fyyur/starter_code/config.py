@@ -1,13 +1,92 @@
 import os
-SECRET_KEY = os.urandom(32)
+# Set SECRET_KEY in the environment when running several worker processes:
+# each would otherwise sign sessions (and flashed messages) with its own key.
+SECRET_KEY = os.environ.get('SECRET_KEY') or os.urandom(32)
 # Grabs the folder where the script runs.
 basedir = os.path.abspath(os.path.dirname(__file__))
 
-# Enable debug mode.
-DEBUG = True
+# Enable debug mode. gunicorn.conf.py turns it off.
+DEBUG = os.environ.get('FYYUR_DEBUG', '1') == '1'
 
 # Connect to the database
 
 
 # TODO (DONE) IMPLEMENT DATABASE URL
-SQLALCHEMY_DATABASE_URI = 'postgres:///fyyur'
+SQLALCHEMY_DATABASE_URI = os.environ.get('DATABASE_URL', 'postgres:///fyyur')
+
+# Connection pool of each process. Under gunicorn every worker has its own,
+# so keep workers * (DB_POOL_SIZE + DB_MAX_OVERFLOW) below the server's
+# max_connections; gunicorn.conf.py sizes it to the worker's threads.
+SQLALCHEMY_ENGINE_OPTIONS = {
+    'pool_size': int(os.environ.get('DB_POOL_SIZE', 5)),
+    'max_overflow': int(os.environ.get('DB_MAX_OVERFLOW', 10)),
+    'pool_pre_ping': True,
+}
+
+# Read replicas for the read-only views, as a comma-separated list of URLs,
+# e.g. DATABASE_REPLICA_URLS=postgres:///fyyur_replica. Each one becomes a
+# bind named replica0, replica1, ...
+SQLALCHEMY_BINDS = dict(
+    ('replica%d' % i, url.strip())
+    for i, url in enumerate(os.environ.get('DATABASE_REPLICA_URLS', '').split(','))
+    if url.strip())
+REPLICA_BINDS = sorted(SQLALCHEMY_BINDS)
+# How long a client keeps reading from the primary after one of its writes.
+REPLICA_STICKY_SECONDS = 5
+
+# Shows per page on artist pages and the /artists/<id>/shows schedule API.
+SCHEDULE_PAGE_SIZE = 12
+SCHEDULE_MAX_PAGE_SIZE = 100
+
+# Maximum rows shown on the venue and artist search pages.
+SEARCH_RESULT_LIMIT = 50
+
+# Shows per page on /shows.
+SHOWS_PAGE_SIZE = 60
+
+# Artists per page on /artists (and per infinite-scroll load).
+ARTISTS_PAGE_SIZE = 60
+
+# Venues and artists listed on /top.
+TOP_LIMIT = 10
+
+# How long a show occupies its venue; bookings closer together than this
+# are rejected as double bookings.
+SHOW_DURATION_MINUTES = 180
+
+# Serve static files under content-hashed names (see assets.py). They are
+# (re)built at startup, or with STATIC_BUILD_ON_STARTUP off, read from what
+# `flask build-assets` wrote to static/build/.
+STATIC_FINGERPRINT = not DEBUG
+STATIC_BUILD_ON_STARTUP = True
+
+# Log file used when DEBUG is off: JSON lines, rotated at LOG_MAX_BYTES, or
+# by time when LOG_ROTATE_WHEN is set (e.g. 'midnight'; see
+# logging.handlers.TimedRotatingFileHandler), keeping LOG_BACKUP_COUNT files.
+LOG_FILE = os.environ.get('FYYUR_LOG_FILE', os.path.join(basedir, 'fyyur.log'))
+LOG_LEVEL = 'INFO'
+LOG_MAX_BYTES = 10 * 1024 * 1024
+LOG_ROTATE_WHEN = None
+LOG_BACKUP_COUNT = 5
+# Leave rotation to an external tool such as logrotate, reopening the file
+# when it is moved: the handlers above must not rotate a file that several
+# processes write to. gunicorn.conf.py turns it on.
+LOG_ROTATE_EXTERNALLY = os.environ.get('FYYUR_LOG_ROTATE_EXTERNALLY') == '1'
+
+# Most ids accepted by one POST /<venues|artists|shows>/delete.
+BULK_DELETE_MAX_IDS = 10000
+
+# Per-request SQL statistics (querystats.py). A statement shape run this many
+# times in one request is logged as a possible N+1; a request running
+# QUERY_WARN_COUNT statements or more is logged too.
+QUERY_REPEAT_THRESHOLD = 5
+QUERY_WARN_COUNT = 50
+# Serve the slowest QUERY_SLOW_REQUESTS requests as JSON at /debug/queries.
+# Leave off in production: it shows SQL and URLs.
+QUERY_DEBUG_ENDPOINT = os.environ.get('FYYUR_QUERY_DEBUG') == '1'
+QUERY_SLOW_REQUESTS = 20
+
+# Relay committed changes between worker processes (changefeed.py) through
+# Postgres NOTIFY on this channel, so that each one's caches stay current.
+CHANGE_FEED = os.environ.get('FYYUR_CHANGE_FEED', '1') == '1'
+CHANGE_FEED_CHANNEL = 'fyyur_changes'
@@ -0,0 +1,66 @@
+#----------------------------------------------------------------------------#
+# Genre facet counts ("Jazz: 412 venues") held in memory.
+#----------------------------------------------------------------------------#
+
+import threading
+from collections import Counter
+
+
+class GenreFacets(object):
+    """Number of rows of each kind ('venues', 'artists') listing each genre.
+
+    A kind is loaded once from the database and then kept current by add()
+    and remove() as rows are written; reset() drops it so that the next
+    reader reloads it. A load that races with a change to its kind is thrown
+    away instead of being kept, as the change may or may not be in it.
+    """
+
+    def __init__(self):
+        self._counts = {}
+        self._generations = Counter()
+        self._lock = threading.Lock()
+
+    def loaded(self, kind):
+        return kind in self._counts
+
+    def load(self, kind, loader):
+        """Replace the counts of kind with the (genre, count) rows loader()
+        returns, unless kind changed meanwhile; returns them as counts()
+        would either way."""
+        generation = self._generations[kind]
+        counts = Counter(dict(loader()))
+        with self._lock:
+            if generation == self._generations[kind]:
+                self._counts[kind] = counts
+        return _sorted(counts)
+
+    def reset(self, kind):
+        with self._lock:
+            self._generations[kind] += 1
+            self._counts.pop(kind, None)
+
+    def add(self, kind, genres):
+        with self._lock:
+            self._generations[kind] += 1
+            if kind in self._counts:
+                self._counts[kind].update(set(genres or ()))
+
+    def remove(self, kind, genres):
+        with self._lock:
+            self._generations[kind] += 1
+            counts = self._counts.get(kind)
+            if counts is None:
+                return
+            counts.subtract(set(genres or ()))
+            for genre in set(genres or ()):
+                if counts[genre] <= 0:
+                    del counts[genre]
+
+    def counts(self, kind):
+        """[(genre, count)], most common first, then by name."""
+        with self._lock:
+            return _sorted(self._counts.get(kind, {}))
+
+
+def _sorted(counts):
+    return sorted(counts.items(), key=lambda item: (-item[1], item[0]))
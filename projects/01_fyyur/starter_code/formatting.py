@@ -0,0 +1,52 @@
+#----------------------------------------------------------------------------#
+# Date formatting for templates.
+#----------------------------------------------------------------------------#
+
+from datetime import datetime
+from functools import lru_cache
+
+import babel
+import babel.dates
+import dateutil.parser
+
+# Named formats usable as `value|datetime('full')`; any other name or pattern
+# is handed to Babel as-is.
+DATETIME_FORMATS = {
+    'full': "EEEE MMMM, d, y 'at' h:mma",
+    'medium': "EE MM, dd, y h:mma",
+}
+
+# Babel's own standard formats, which are not plain patterns.
+BABEL_STANDARD_FORMATS = ('long', 'short')
+
+
+@lru_cache(maxsize=128)
+def compiled_format(format, locale):
+    """Parse a format name/pattern and a locale identifier once per pair."""
+    locale = babel.Locale.parse(locale)
+    if format in BABEL_STANDARD_FORMATS:
+        return None, locale
+    return babel.dates.parse_pattern(DATETIME_FORMATS.get(format, format)), locale
+
+
+@lru_cache(maxsize=8192)
+def _render(value, format, locale):
+    pattern, locale = compiled_format(format, locale)
+    if pattern is None:
+        return babel.dates.format_datetime(value, format, locale=locale)
+    # Babel reads naive datetimes as UTC; do the same so output is unchanged.
+    if value.tzinfo is None:
+        value = value.replace(tzinfo=babel.dates.UTC)
+    return pattern.apply(value, locale)
+
+
+def format_datetime(value, format='medium', locale=None):
+    """Jinja `datetime` filter.
+
+    Real datetime objects (what the models hand to templates) skip the
+    string round trip through dateutil; rendered strings are memoized per
+    (value, format, locale).
+    """
+    if not isinstance(value, datetime):
+        value = dateutil.parser.parse(str(value))
+    return _render(value, format, locale or babel.dates.LC_TIME)
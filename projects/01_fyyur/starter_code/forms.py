@@ -1,6 +1,6 @@
 from datetime import datetime
 from flask_wtf import Form
-from wtforms import StringField, SelectField, SelectMultipleField, DateTimeField, BooleanField
+from wtforms import StringField, SelectField, SelectMultipleField, DateTimeField, BooleanField, HiddenField
 from wtforms.validators import DataRequired, AnyOf, URL
 
 def validate_phone(self, phone):
@@ -129,6 +129,7 @@ class VenueForm(Form):
     seeking_talent=SelectField('seeking_talent', validators=[DataRequired()], choices=[(True, 'Yes'),(False, 'No'),]
     )
     seeking_description=StringField('seeking_description')
+    version=HiddenField('version')
     
 
 
@@ -237,5 +238,6 @@ class ArtistForm(Form):
     seeking_venue=SelectField('seeking_venue', validators=[DataRequired()], choices=[(True, 'Yes'),(False, 'No'),]
     )
     seeking_description=StringField('seeking_description')
+    version=HiddenField('version')
 
 # TODO IMPLEMENT NEW ARTIST FORM AND NEW SHOW FORM
@@ -0,0 +1,55 @@
+#----------------------------------------------------------------------------#
+# Production server.
+#
+#   SECRET_KEY=... gunicorn -c gunicorn.conf.py app:app
+#
+# Forks WEB_CONCURRENCY worker processes (default: 2 per CPU core, plus one),
+# each serving GUNICORN_THREADS requests at a time. Every worker imports the
+# app after the fork, so each has its own connection pool, sized here to its
+# threads, and its own caches, kept in step by the change feed (changefeed.py).
+#----------------------------------------------------------------------------#
+
+import multiprocessing
+import os
+
+if not os.environ.get('SECRET_KEY'):
+    # with a random key per worker, a session signed by one is rejected by
+    # the others
+    raise RuntimeError('set SECRET_KEY in the environment for the workers to share')
+
+os.environ.setdefault('FYYUR_DEBUG', '0')
+# the workers share LOG_FILE; rotate it with logrotate, not from each worker
+os.environ.setdefault('FYYUR_LOG_ROTATE_EXTERNALLY', '1')
+
+bind = os.environ.get('GUNICORN_BIND', '0.0.0.0:%s' % os.environ.get('PORT', '8000'))
+workers = int(os.environ.get('WEB_CONCURRENCY', multiprocessing.cpu_count() * 2 + 1))
+threads = int(os.environ.get('GUNICORN_THREADS', 4))
+worker_class = 'gthread'
+timeout = 30
+graceful_timeout = 30
+keepalive = 5
+# recycle workers now and then, staggered, to bound any slow leak
+max_requests = 2000
+max_requests_jitter = 200
+
+# one pooled connection per thread, with a little headroom; the change feed
+# listener holds one more, outside the pool
+os.environ.setdefault('DB_POOL_SIZE', str(threads))
+os.environ.setdefault('DB_MAX_OVERFLOW', '2')
+
+accesslog = None  # the app logs its own access records (logconfig.py)
+errorlog = '-'
+
+
+def post_worker_init(worker):
+    # the listener thread has to start in the worker, not the master
+    change_feed = worker.wsgi.extensions.get('change_feed')
+    if change_feed is not None:
+        change_feed.start()
+    # load the autocomplete names now rather than on the first lookup
+    from app import loaded_name_index
+    with worker.wsgi.app_context():
+        try:
+            loaded_name_index()
+        except Exception:
+            worker.log.exception('could not load the name index; it loads on first use instead')
@@ -0,0 +1,186 @@
+#----------------------------------------------------------------------------#
+# Bulk import of venues, artists and shows from CSV or JSON files.
+#
+#   flask import-data venues venues.csv
+#   flask import-data artists artists.jsonl
+#   flask import-data shows shows.csv --batch-size 20000
+#
+# Files are streamed: CSV (header row = column names) and JSON Lines are read
+# a row at a time; a .json file holding one array is loaded whole. Venues and
+# artists go in with multi-row INSERTs, shows with COPY. The whole import is
+# one transaction, which ends by recounting the show counts of stats.py.
+#
+# The import runs in its own process, so the 'bulk' change it publishes only
+# reaches a running server's caches through the change feed (changefeed.py,
+# on unless FYYUR_CHANGE_FEED=0). Without it, restart the server: the name
+# index and genre facets never expire on their own.
+#----------------------------------------------------------------------------#
+
+import csv
+import io
+import json
+import time
+from datetime import datetime
+from itertools import islice
+
+import click
+import dateutil.parser
+from flask.cli import with_appcontext
+from psycopg2.extras import execute_values
+
+import stats
+from cache import Change, publish
+from models import db, Venue, Artist, Show
+
+VENUE_COLUMNS = ('name', 'city', 'state', 'address', 'phone', 'genres', 'image_link',
+                 'seeking_talent', 'seeking_description', 'website', 'facebook_link')
+ARTIST_COLUMNS = ('name', 'city', 'state', 'phone', 'genres', 'image_link',
+                  'seeking_venue', 'seeking_description', 'website', 'facebook_link')
+BOOLEAN_COLUMNS = ('seeking_talent', 'seeking_venue')
+
+
+def read_records(path):
+    """Yield one dict per row of a .csv, .jsonl/.ndjson or .json file."""
+    if path.endswith('.csv'):
+        with open(path, newline='', encoding='utf-8') as f:
+            for row in csv.DictReader(f):
+                yield row
+    elif path.endswith(('.jsonl', '.ndjson')):
+        with open(path, encoding='utf-8') as f:
+            for line in f:
+                if line.strip():
+                    yield json.loads(line)
+    elif path.endswith('.json'):
+        with open(path, encoding='utf-8') as f:
+            for row in json.load(f):
+                yield row
+    else:
+        raise click.BadParameter('expected a .csv, .jsonl, .ndjson or .json file', param_hint='PATH')
+
+
+def batches(records, size):
+    records = iter(records)
+    while True:
+        batch = list(islice(records, size))
+        if not batch:
+            return
+        yield batch
+
+
+def parse_genres(value):
+    # CSV cells hold "Jazz;Rock"; JSON holds a list
+    if value is None or isinstance(value, list):
+        return value or []
+    return [genre.strip() for genre in value.split(';') if genre.strip()]
+
+
+def parse_boolean(value):
+    if isinstance(value, bool) or value is None:
+        return bool(value)
+    return value.strip().lower() in ('1', 'true', 'yes', 'y')
+
+
+def parse_datetime(value):
+    if isinstance(value, datetime):
+        return value
+    try:
+        return datetime.fromisoformat(value)
+    except ValueError:
+        return dateutil.parser.parse(value)
+
+
+def _entity_row(record, columns):
+    row = []
+    for column in columns:
+        value = record.get(column)
+        if column == 'genres':
+            value = parse_genres(value)
+        elif column in BOOLEAN_COLUMNS:
+            value = parse_boolean(value)
+        elif value == '':
+            value = None
+        row.append(value)
+    return tuple(row)
+
+
+def insert_entities(cursor, model, columns, records):
+    """Multi-row INSERT; rows whose name already exists are skipped.
+
+    Returns the number of rows inserted.
+    """
+    sql = 'INSERT INTO "%s" (%s) VALUES %%s ON CONFLICT (name) DO NOTHING RETURNING id' % (
+        model.__tablename__, ', '.join(columns))
+    rows = [_entity_row(record, columns) for record in records]
+    return len(execute_values(cursor, sql, rows, page_size=len(rows), fetch=True))
+
+
+class NameResolver(object):
+    """Maps names (or ids given as `<kind>_id`) to primary keys, loaded once."""
+
+    def __init__(self, model, kind):
+        self.kind = kind
+        self.ids = dict(db.session.query(model.name, model.id))
+        self.known = set(self.ids.values())
+
+    def __call__(self, record):
+        id = record.get(self.kind + '_id')
+        if id not in (None, ''):
+            id = int(id)
+            return id if id in self.known else None
+        return self.ids.get(record.get(self.kind + '_name') or record.get(self.kind))
+
+
+def copy_shows(cursor, records, artists, venues):
+    """COPY a batch of shows. Returns (inserted, skipped) counts."""
+    buffer = io.StringIO()
+    writer = csv.writer(buffer)
+    skipped = 0
+    for record in records:
+        artist_id, venue_id = artists(record), venues(record)
+        if artist_id is None or venue_id is None or not record.get('start_time'):
+            skipped += 1
+            continue
+        writer.writerow((parse_datetime(record['start_time']).isoformat(), venue_id, artist_id))
+    buffer.seek(0)
+    cursor.copy_expert(
+        'COPY "Show" (start_time, venue_id, artist_id) FROM STDIN WITH (FORMAT csv)', buffer)
+    return len(records) - skipped, skipped
+
+
+@click.command('import-data')
+@click.argument('kind', type=click.Choice(['venues', 'artists', 'shows']))
+@click.argument('path', type=click.Path(exists=True, dir_okay=False))
+@click.option('--batch-size', default=5000, show_default=True, help='Rows per INSERT/COPY.')
+@with_appcontext
+def import_data(kind, path, batch_size):
+    """Load venues, artists or shows from a CSV/JSON file."""
+    model = {'venues': Venue, 'artists': Artist, 'shows': Show}[kind]
+    cursor = db.session.connection().connection.cursor()
+    if kind == 'shows':
+        artists, venues = NameResolver(Artist, 'artist'), NameResolver(Venue, 'venue')
+        load = lambda batch: copy_shows(cursor, batch, artists, venues)
+    else:
+        columns = VENUE_COLUMNS if kind == 'venues' else ARTIST_COLUMNS
+        def load(batch):
+            inserted = insert_entities(cursor, model, columns, batch)
+            return inserted, len(batch) - inserted
+
+    started = time.time()
+    inserted = skipped = 0
+    try:
+        for batch in batches(read_records(path), batch_size):
+            batch_inserted, batch_skipped = load(batch)
+            inserted += batch_inserted
+            skipped += batch_skipped
+            elapsed = time.time() - started
+            click.echo('%s: %d rows read, %d inserted, %d skipped (%.0f rows/s)' % (
+                kind, inserted + skipped, inserted, skipped, (inserted + skipped) / max(elapsed, 1e-6)))
+        if kind == 'shows':
+            stats.rebuild(datetime.now())
+        db.session.commit()
+    except Exception:
+        db.session.rollback()
+        raise
+    # relayed to running servers by the change feed, if on
+    publish([Change('bulk', model, {}, {})])
+    click.echo('%s: imported %d rows in %.1fs' % (kind, inserted, time.time() - started))
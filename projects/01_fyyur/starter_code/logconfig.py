@@ -0,0 +1,138 @@
+#----------------------------------------------------------------------------#
+# Logging.
+#
+# Request threads only put records on an in-memory queue (QueueHandler); a
+# QueueListener thread formats them as JSON lines and writes them to a file
+# that rotates by size (LOG_MAX_BYTES) or, with LOG_ROTATE_WHEN set, by time.
+# Rotation renames the file under any other process writing to it, so with
+# several workers (LOG_ROTATE_EXTERNALLY) the file is only reopened after an
+# external tool such as logrotate has moved it.
+# Every record logged while handling a request carries its request id, and
+# each request ends with one access record giving its status and latency.
+#----------------------------------------------------------------------------#
+
+import atexit
+import copy
+import json
+import logging
+import queue
+import time
+import uuid
+from datetime import datetime, timezone
+from logging.handlers import (QueueHandler, QueueListener, RotatingFileHandler, TimedRotatingFileHandler,
+                              WatchedFileHandler)
+
+from flask import g, request, has_request_context
+from flask.logging import default_handler
+
+REQUEST_ID_HEADER = 'X-Request-ID'
+
+# LogRecord attributes that are not worth repeating in every JSON line
+_STANDARD_ATTRS = set(vars(logging.LogRecord('', 0, '', 0, '', (), None))) | {'message', 'asctime'}
+
+
+class JsonFormatter(logging.Formatter):
+    """One JSON object per record: time, level, logger, message, any
+    `extra` fields (request_id, latency_ms, ...) and the traceback, if any."""
+
+    def format(self, record):
+        entry = {
+            'time': datetime.fromtimestamp(record.created, timezone.utc).isoformat(timespec='milliseconds'),
+            'level': record.levelname,
+            'logger': record.name,
+            'message': record.getMessage(),
+        }
+        for key, value in vars(record).items():
+            if key not in _STANDARD_ATTRS and not key.startswith('_'):
+                entry[key] = value
+        if record.exc_info:
+            entry['exc_info'] = self.formatException(record.exc_info)
+        elif record.exc_text:
+            entry['exc_info'] = record.exc_text
+        if record.levelno >= logging.WARNING:
+            entry['source'] = '%s:%d' % (record.pathname, record.lineno)
+        return json.dumps(entry, default=str)
+
+
+class RequestContextFilter(logging.Filter):
+    """Stamps records made during a request with its id, method and path."""
+
+    def filter(self, record):
+        if has_request_context():
+            record.request_id = g.get('request_id')
+            record.method = request.method
+            record.path = request.path
+        return True
+
+
+class _QueueHandler(QueueHandler):
+
+    def prepare(self, record):
+        # merge args into the message and render the traceback here, in the
+        # request thread, so the record can cross to the listener thread
+        # without references to request-scoped objects
+        record = copy.copy(record)
+        record.msg = record.message = record.getMessage()
+        record.args = None
+        if record.exc_info:
+            record.exc_text = logging.Formatter().formatException(record.exc_info)
+            record.exc_info = None
+        return record
+
+
+def _file_handler(config):
+    if config['LOG_ROTATE_EXTERNALLY']:
+        return WatchedFileHandler(config['LOG_FILE'], encoding='utf-8', delay=True)
+    if config['LOG_ROTATE_WHEN']:
+        return TimedRotatingFileHandler(config['LOG_FILE'], when=config['LOG_ROTATE_WHEN'],
+                                        backupCount=config['LOG_BACKUP_COUNT'], encoding='utf-8', delay=True)
+    return RotatingFileHandler(config['LOG_FILE'], maxBytes=config['LOG_MAX_BYTES'],
+                               backupCount=config['LOG_BACKUP_COUNT'], encoding='utf-8', delay=True)
+
+
+def init_request_ids(app):
+    """Give every request an id (the client's X-Request-ID, if it sent one),
+    echo it in the response and log one access record per request."""
+
+    @app.before_request
+    def start_request():
+        request_id = request.headers.get(REQUEST_ID_HEADER, '')
+        g.request_id = request_id if 0 < len(request_id) <= 128 else uuid.uuid4().hex
+        g.request_started = time.perf_counter()
+
+    @app.after_request
+    def log_request(response):
+        request_id = g.get('request_id')
+        if request_id is None:
+            return response
+        response.headers[REQUEST_ID_HEADER] = request_id
+        latency_ms = round((time.perf_counter() - g.request_started) * 1000, 2)
+        app.logger.info('%s %s %d', request.method, request.full_path.rstrip('?'), response.status_code,
+                        extra={'status': response.status_code, 'latency_ms': latency_ms})
+        return response
+
+
+def init_logging(app):
+    """Send app.logger's records through a queue to a rotating JSON log file.
+
+    Returns the started QueueListener; it is stopped (and the queue flushed)
+    at interpreter exit.
+    """
+    config = app.config
+    handler = _file_handler(config)
+    handler.setFormatter(JsonFormatter())
+    handler.setLevel(config['LOG_LEVEL'])
+
+    records = queue.SimpleQueue()
+    queue_handler = _QueueHandler(records)
+    queue_handler.addFilter(RequestContextFilter())
+    # Flask's own handler would write every record to stderr as well, on the
+    # request thread
+    app.logger.removeHandler(default_handler)
+    app.logger.addHandler(queue_handler)
+    app.logger.setLevel(config['LOG_LEVEL'])
+
+    listener = QueueListener(records, handler, respect_handler_level=True)
+    listener.start()
+    atexit.register(listener.stop)
+    return listener
@@ -72,6 +72,11 @@ def run_migrations_online():
                 directives[:] = []
                 logger.info('No changes in schema detected.')
 
+    # backfill.py keeps its checkpoints in a table of its own, and triggers
+    # keep table_version; autogenerate would otherwise offer to drop them
+    def include_object(object, name, type_, reflected, compare_to):
+        return not (type_ == 'table' and name in ('backfill_checkpoint', 'table_version'))
+
     connectable = engine_from_config(
         config.get_section(config.config_ini_section),
         prefix='sqlalchemy.',
@@ -83,6 +88,7 @@ def run_migrations_online():
             connection=connection,
             target_metadata=target_metadata,
             process_revision_directives=process_revision_directives,
+            include_object=include_object,
             **current_app.extensions['migrate'].configure_args
         )
 
@@ -0,0 +1,42 @@
+"""Count each venue's and artist's shows
+
+Revision ID: 41d390fed5c0
+Revises: 85df54d1c194
+Create Date: 2026-10-18 13:04:37.091583
+
+"""
+from alembic import op
+import sqlalchemy as sa
+
+from backfill import backfill, forget
+
+
+# revision identifiers, used by Alembic.
+revision = '41d390fed5c0'
+down_revision = '85df54d1c194'
+branch_labels = None
+depends_on = None
+
+# each row recounted from its own shows, through the Show (venue_id,
+# start_time) and (artist_id, start_time) indexes of revision 2712fc3b374f.
+# LOCALTIMESTAMP, as the app compares start_time with datetime.now().
+COUNTS = """
+upcoming_shows = (SELECT count(*) FROM "Show"
+                  WHERE "Show".{key} = "{table}".{key} AND start_time > LOCALTIMESTAMP),
+past_shows = (SELECT count(*) FROM "Show"
+              WHERE "Show".{key} = "{table}".{key} AND start_time <= LOCALTIMESTAMP),
+next_show = (SELECT min(start_time) FROM "Show"
+             WHERE "Show".{key} = "{table}".{key} AND start_time > LOCALTIMESTAMP)
+"""
+
+
+def upgrade():
+    backfill('venue_stats', 'VenueStats', COUNTS.format(table='VenueStats', key='venue_id'), key='venue_id')
+    backfill('artist_stats', 'ArtistStats', COUNTS.format(table='ArtistStats', key='artist_id'), key='artist_id')
+
+
+def downgrade():
+    forget('artist_stats')
+    forget('venue_stats')
+    op.execute('UPDATE "VenueStats" SET upcoming_shows = 0, past_shows = 0, next_show = NULL')
+    op.execute('UPDATE "ArtistStats" SET upcoming_shows = 0, past_shows = 0, next_show = NULL')
@@ -0,0 +1,46 @@
+"""Add trigram and full-text search indexes for venues and artists
+
+Revision ID: 82913c56385a
+Revises: 76d372d519bb
+Create Date: 2026-10-18 09:12:40.118204
+
+"""
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision = '82913c56385a'
+down_revision = '76d372d519bb'
+branch_labels = None
+depends_on = None
+
+
+# array_to_string() is only STABLE, so it can't appear in an index expression
+# directly; wrapping the whole document in an IMMUTABLE function can.
+SEARCH_DOCUMENT_FUNCTION = """
+CREATE OR REPLACE FUNCTION fyyur_search_document(name text, city text, genres varchar[])
+RETURNS tsvector LANGUAGE sql IMMUTABLE AS $$
+  SELECT setweight(to_tsvector('simple', coalesce(name, '')), 'A') ||
+         setweight(to_tsvector('simple', coalesce(city, '')), 'B') ||
+         setweight(to_tsvector('simple', coalesce(array_to_string(genres, ' '), '')), 'C')
+$$
+"""
+
+
+def upgrade():
+    op.execute('CREATE EXTENSION IF NOT EXISTS pg_trgm')
+    op.execute(SEARCH_DOCUMENT_FUNCTION)
+    for table in ('Venue', 'Artist'):
+        op.create_index('ix_%s_name_trgm' % table, table, ['name'],
+                        postgresql_using='gin', postgresql_ops={'name': 'gin_trgm_ops'})
+        op.create_index('ix_%s_search_document' % table, table,
+                        [sa.text('fyyur_search_document(name, city, genres)')],
+                        postgresql_using='gin')
+
+
+def downgrade():
+    for table in ('Artist', 'Venue'):
+        op.drop_index('ix_%s_search_document' % table, table_name=table)
+        op.drop_index('ix_%s_name_trgm' % table, table_name=table)
+    op.execute('DROP FUNCTION fyyur_search_document(text, text, varchar[])')
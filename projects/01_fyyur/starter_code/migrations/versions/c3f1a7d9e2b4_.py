@@ -0,0 +1,53 @@
+"""Keep a version per table, bumped by triggers
+
+Revision ID: c3f1a7d9e2b4
+Revises: 41d390fed5c0
+Create Date: 2026-10-18 15:12:08.413027
+
+"""
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision = 'c3f1a7d9e2b4'
+down_revision = '41d390fed5c0'
+branch_labels = None
+depends_on = None
+
+# the tables behind the pages' ETag/Last-Modified validators (conditional.py)
+TABLES = ('Venue', 'Artist', 'Show')
+
+# microseconds since the epoch of the table's last write, or one more than
+# before if the clock hasn't moved past it; the row lock also orders writers
+NOW = "(extract(epoch FROM clock_timestamp()) * 1000000)::bigint"
+
+
+def upgrade():
+    op.create_table('table_version',
+    sa.Column('table_name', sa.String(length=64), nullable=False),
+    sa.Column('version', sa.BigInteger(), nullable=False),
+    sa.PrimaryKeyConstraint('table_name')
+    )
+    op.execute("INSERT INTO table_version (table_name, version) VALUES %s"
+               % ', '.join("('%s', %s)" % (table, NOW) for table in TABLES))
+    op.execute("""
+CREATE FUNCTION bump_table_version() RETURNS trigger LANGUAGE plpgsql AS $$
+BEGIN
+    UPDATE table_version SET version = greatest(version + 1, %s)
+    WHERE table_name = TG_TABLE_NAME;
+    RETURN NULL;
+END $$
+""" % NOW)
+    for table in TABLES:
+        # per statement, so that a bulk write bumps the version once; cascaded
+        # deletes and COPY fire them too
+        op.execute('CREATE TRIGGER "%s_version" AFTER INSERT OR UPDATE OR DELETE OR TRUNCATE ON "%s" '
+                   'FOR EACH STATEMENT EXECUTE PROCEDURE bump_table_version()' % (table, table))
+
+
+def downgrade():
+    for table in TABLES:
+        op.execute('DROP TRIGGER "%s_version" ON "%s"' % (table, table))
+    op.execute('DROP FUNCTION bump_table_version()')
+    op.drop_table('table_version')
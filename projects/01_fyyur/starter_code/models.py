@@ -1,10 +1,10 @@
 from flask import Flask
-from flask_sqlalchemy import SQLAlchemy
 from flask_migrate import Migrate
 from datetime import datetime
+from routing import RoutingSQLAlchemy
 
 app = Flask(__name__)
-db = SQLAlchemy(app)
+db = RoutingSQLAlchemy(app)
 migrate = Migrate(app, db)
 
 #----------------------------------------------------------------------------#
@@ -26,8 +26,12 @@ class Venue(db.Model):
     seeking_description = db.Column(db.String(500))
     website = db.Column(db.String(120))
     facebook_link = db.Column(db.String(120))
+    # bumped on every update; edits must name the version they started from
+    version = db.Column(db.Integer, nullable=False, default=1, server_default='1')
     shows = db.relationship('Show', backref='venue', passive_deletes=True)
 
+    __mapper_args__ = {'version_id_col': version}
+
     def __repr__(self):
       return '<Venue ' + str(self.id) + ' '+ str(self.name)+ '>'
     @property
@@ -53,8 +57,12 @@ class Artist(db.Model):
     seeking_description = db.Column(db.String(500))
     website = db.Column(db.String(120))
     facebook_link = db.Column(db.String(120))
+    # bumped on every update; edits must name the version they started from
+    version = db.Column(db.Integer, nullable=False, default=1, server_default='1')
     shows = db.relationship('Show', backref='artist', passive_deletes=True)
 
+    __mapper_args__ = {'version_id_col': version}
+
     def __repr__(self):
       return '<Artist ' + str(self.id) + ' '+ str(self.name)+ '>'
 
@@ -71,4 +79,57 @@ class Show(db.Model):
   
     # TODO: implement any missing fields, as a database migration using Flask-Migrate
 
+class VenueStats(db.Model):
+    """Show counts of a venue, kept current by stats.py as shows are added
+    and deleted. A venue that never had a show may have no row."""
+    __tablename__ = 'VenueStats'
+
+    venue_id = db.Column(db.Integer, db.ForeignKey('Venue.id', ondelete='CASCADE'), primary_key=True)
+    upcoming_shows = db.Column(db.Integer, nullable=False, default=0, server_default='0')
+    past_shows = db.Column(db.Integer, nullable=False, default=0, server_default='0')
+    # start of the earliest upcoming show; once it has passed, the counts are
+    # recounted (stats.roll)
+    next_show = db.Column(db.DateTime)
+
+class ArtistStats(db.Model):
+    """Artist counterpart of VenueStats."""
+    __tablename__ = 'ArtistStats'
+
+    artist_id = db.Column(db.Integer, db.ForeignKey('Artist.id', ondelete='CASCADE'), primary_key=True)
+    upcoming_shows = db.Column(db.Integer, nullable=False, default=0, server_default='0')
+    past_shows = db.Column(db.Integer, nullable=False, default=0, server_default='0')
+    next_show = db.Column(db.DateTime)
+
+# Search indexes, created in migration 82913c56385a. fyyur_search_document() is
+# a SQL function defined by that migration.
+db.Index('ix_Venue_name_trgm', Venue.name,
+         postgresql_using='gin', postgresql_ops={'name': 'gin_trgm_ops'})
+db.Index('ix_Venue_search_document',
+         db.func.fyyur_search_document(Venue.name, Venue.city, Venue.genres),
+         postgresql_using='gin')
+db.Index('ix_Artist_name_trgm', Artist.name,
+         postgresql_using='gin', postgresql_ops={'name': 'gin_trgm_ops'})
+db.Index('ix_Artist_search_document',
+         db.func.fyyur_search_document(Artist.name, Artist.city, Artist.genres),
+         postgresql_using='gin')
+
+# Genre filters (genres @> ARRAY[...]), created in migration 4768d671624f.
+db.Index('ix_Venue_genres', Venue.genres, postgresql_using='gin')
+db.Index('ix_Artist_genres', Artist.genres, postgresql_using='gin')
+
+# Show lookups by venue or artist, optionally within a time range, and the
+# /shows listing in (start_time, id) order; created in migration 2712fc3b374f.
+db.Index('ix_Show_venue_id_start_time', Show.venue_id, Show.start_time)
+db.Index('ix_Show_artist_id_start_time', Show.artist_id, Show.start_time)
+db.Index('ix_Show_start_time_id', Show.start_time, Show.id)
+
+# Rankings by upcoming or total shows, and the rows due to be recounted;
+# created in migration 85df54d1c194.
+db.Index('ix_VenueStats_upcoming', VenueStats.upcoming_shows.desc(), VenueStats.venue_id)
+db.Index('ix_VenueStats_total', (VenueStats.upcoming_shows + VenueStats.past_shows).desc(), VenueStats.venue_id)
+db.Index('ix_VenueStats_next_show', VenueStats.next_show)
+db.Index('ix_ArtistStats_upcoming', ArtistStats.upcoming_shows.desc(), ArtistStats.artist_id)
+db.Index('ix_ArtistStats_total', (ArtistStats.upcoming_shows + ArtistStats.past_shows).desc(), ArtistStats.artist_id)
+db.Index('ix_ArtistStats_next_show', ArtistStats.next_show)
+
 # TODO Implement Show and Artist models, and complete all model relationships and properties, as a database migration.
@@ -0,0 +1,257 @@
+#----------------------------------------------------------------------------#
+# Read queries shared by the views.
+#----------------------------------------------------------------------------#
+
+import base64
+import binascii
+from datetime import datetime
+from itertools import groupby
+
+from sqlalchemy import tuple_
+from sqlalchemy.dialects.postgresql import array
+
+from models import db, Venue, Artist, Show
+from readmodels import VenueListing, ArtistListing, ShowListing
+
+
+def has_genres(column, genres):
+    """column @> ARRAY[genres...], which the column's GIN index can answer."""
+    return column.op('@>')(db.cast(array(list(genres)), column.type))
+
+
+def venue_areas(now, genres=()):
+    """Group every venue by (city, state) with its number of upcoming shows.
+
+    With genres, only venues listing every one of them are included.
+    Runs a single grouped query. Returns (areas, expires), where expires is
+    the start of the soonest upcoming show: once it passes, a count is stale.
+    """
+    upcoming = Show.start_time > now
+    query = db.session.query(
+        Venue.id,
+        Venue.name,
+        Venue.city,
+        Venue.state,
+        db.func.count(Show.id).filter(upcoming).label('num_upcoming_shows'),
+        db.func.min(Show.start_time).filter(upcoming).label('next_show'),
+    ).outerjoin(Show, Show.venue_id == Venue.id)
+    if genres:
+        query = query.filter(has_genres(Venue.genres, genres))
+    rows = query.group_by(Venue.id) \
+                .order_by(Venue.city, Venue.state, Venue.name) \
+                .all()
+
+    areas = []
+    for (city, state), venues in groupby(rows, key=lambda row: (row.city, row.state)):
+        areas.append({
+            'city': city,
+            'state': state,
+            'venues': [VenueListing(row.id, row.name, row.num_upcoming_shows) for row in venues]
+        })
+    next_shows = [row.next_show for row in rows if row.next_show is not None]
+    return areas, min(next_shows) if next_shows else None
+
+
+def venue_detail(venue_id, now):
+    """Load a venue with its past and upcoming shows in one round trip.
+
+    Returns (data, expires) in the shape pages/show_venue.html expects, or
+    (None, None) when there is no such venue. expires is the start of the
+    venue's next show, when that show moves from upcoming to past.
+    """
+    rows = db.session.query(
+        Venue.id,
+        Venue.name,
+        Venue.city,
+        Venue.state,
+        Venue.address,
+        Venue.phone,
+        Venue.image_link,
+        Venue.facebook_link,
+        Venue.website,
+        Venue.genres,
+        Venue.seeking_talent,
+        Venue.seeking_description,
+        Show.start_time,
+        Artist.id.label('artist_id'),
+        Artist.name.label('artist_name'),
+        Artist.image_link.label('artist_image_link'),
+    ).outerjoin(Show, Show.venue_id == Venue.id) \
+     .outerjoin(Artist, Artist.id == Show.artist_id) \
+     .filter(Venue.id == venue_id) \
+     .order_by(Show.start_time) \
+     .all()
+    if not rows:
+        return None, None
+
+    venue = rows[0]
+    past_shows, upcoming_shows = [], []
+    for row in rows:
+        if row.start_time is None:
+            continue
+        show = {
+            'artist_id': row.artist_id,
+            'artist_name': row.artist_name,
+            'artist_image_link': row.artist_image_link,
+            'start_time': row.start_time
+        }
+        if row.start_time > now:
+            upcoming_shows.append(show)
+        else:
+            past_shows.append(show)
+
+    data = {
+        'id': venue.id,
+        'name': venue.name,
+        'city': venue.city,
+        'state': venue.state,
+        'address': venue.address,
+        'phone': venue.phone,
+        'image_link': venue.image_link,
+        'facebook_link': venue.facebook_link,
+        'website': venue.website,
+        'genres': venue.genres,
+        'seeking_talent': venue.seeking_talent,
+        'seeking_description': venue.seeking_description,
+        'upcoming_shows': upcoming_shows,
+        'past_shows': past_shows,
+        'upcoming_shows_count': len(upcoming_shows),
+        'past_shows_count': len(past_shows)
+    }
+    return data, upcoming_shows[0]['start_time'] if upcoming_shows else None
+
+
+def artists_page(limit, genres=(), after=None, start=None):
+    """One page of ArtistListings by name, keyset-paginated on the (unique)
+    name: those after the name `after` (the previous page's next_cursor),
+    or else those from `start` (e.g. a letter) on. With genres, only artists
+    listing every one of them.
+
+    Each page is one range scan of the name index, however many artists
+    there are. Returns (artists, next_cursor); next_cursor is None on the
+    last page.
+    """
+    query = db.session.query(Artist.id, Artist.name)
+    if genres:
+        query = query.filter(has_genres(Artist.genres, genres))
+    if after is not None:
+        query = query.filter(Artist.name > after)
+    elif start:
+        query = query.filter(Artist.name >= start)
+    rows = query.order_by(Artist.name).limit(limit + 1).all()
+    artists = [ArtistListing._make(row) for row in rows[:limit]]
+    next_cursor = artists[-1].name if len(rows) > limit else None
+    return artists, next_cursor
+
+
+def encode_cursor(start_time, show_id):
+    token = '%s|%d' % (start_time.isoformat(), show_id)
+    return base64.urlsafe_b64encode(token.encode()).decode()
+
+
+def decode_cursor(cursor):
+    """Inverse of encode_cursor(); raises ValueError on a malformed cursor."""
+    try:
+        token = base64.urlsafe_b64decode(cursor.encode()).decode()
+        start_time, show_id = token.split('|')
+        return datetime.fromisoformat(start_time), int(show_id)
+    except (TypeError, UnicodeError, binascii.Error) as e:
+        raise ValueError('invalid cursor: %s' % e)
+
+
+def artist_schedule(artist_id, now, direction, limit, cursor=None):
+    """One page of an artist's shows, keyset-paginated on (start_time, id).
+
+    direction is 'upcoming' (soonest first) or 'past' (most recent first).
+    cursor is the next_cursor of the previous page. Each page is a single
+    range scan however many shows the artist has. Returns (shows, next_cursor).
+    """
+    key = tuple_(Show.start_time, Show.id)
+    query = db.session.query(
+        Show.id,
+        Show.start_time,
+        Venue.id.label('venue_id'),
+        Venue.name.label('venue_name'),
+        Venue.image_link.label('venue_image_link'),
+    ).join(Venue, Venue.id == Show.venue_id) \
+     .filter(Show.artist_id == artist_id)
+
+    if direction == 'upcoming':
+        query = query.filter(Show.start_time > now).order_by(Show.start_time, Show.id)
+        if cursor:
+            query = query.filter(key > decode_cursor(cursor))
+    elif direction == 'past':
+        query = query.filter(Show.start_time <= now).order_by(Show.start_time.desc(), Show.id.desc())
+        if cursor:
+            query = query.filter(key < decode_cursor(cursor))
+    else:
+        raise ValueError('direction must be "upcoming" or "past"')
+
+    rows = query.limit(limit + 1).all()
+    shows = [{
+        'venue_id': row.venue_id,
+        'venue_name': row.venue_name,
+        'venue_image_link': row.venue_image_link,
+        'start_time': row.start_time
+    } for row in rows[:limit]]
+    next_cursor = None
+    if len(rows) > limit:
+        last = rows[limit - 1]
+        next_cursor = encode_cursor(last.start_time, last.id)
+    return shows, next_cursor
+
+
+def artist_show_counts(artist_id, now):
+    """(upcoming, past) show counts for an artist."""
+    upcoming = Show.start_time > now
+    return db.session.query(
+        db.func.count(Show.id).filter(upcoming),
+        db.func.count(Show.id).filter(db.not_(upcoming)),
+    ).filter(Show.artist_id == artist_id).one()
+
+
+class ShowPage(object):
+    """One page of ShowListings, iterated lazily so the query only runs when a
+    (streamed) template first loops over it.
+
+    next_cursor is set once iteration has gone past the last show of the page.
+    """
+
+    def __init__(self, query, limit):
+        self._query = query.limit(limit + 1)
+        self.limit = limit
+        self.next_cursor = None
+
+    def __iter__(self):
+        last = None
+        for i, row in enumerate(self._query):
+            if i == self.limit:
+                self.next_cursor = encode_cursor(last.start_time, last.id)
+                break
+            last = ShowListing._make(row)
+            yield last
+
+
+def shows_page(limit, start=None, end=None, cursor=None):
+    """ShowListings in [start, end) ordered by (start_time, id), with artist
+    and venue names joined in the same SELECT. cursor continues from a
+    previous page.
+    """
+    query = db.session.query(
+        Show.id,
+        Show.start_time,
+        Show.venue_id,
+        Venue.name.label('venue_name'),
+        Show.artist_id,
+        Artist.name.label('artist_name'),
+        Artist.image_link.label('artist_image_link'),
+    ).outerjoin(Venue, Venue.id == Show.venue_id) \
+     .outerjoin(Artist, Artist.id == Show.artist_id) \
+     .order_by(Show.start_time, Show.id)
+    if start is not None:
+        query = query.filter(Show.start_time >= start)
+    if end is not None:
+        query = query.filter(Show.start_time < end)
+    if cursor:
+        query = query.filter(tuple_(Show.start_time, Show.id) > decode_cursor(cursor))
+    return ShowPage(query, limit)
@@ -0,0 +1,161 @@
+#----------------------------------------------------------------------------#
+# Per-request SQL statistics.
+#
+# Engine events count and time every statement a request runs, including
+# lazy loads fired from templates and the queries of streamed pages. The
+# totals go out as X-Query-Count / X-Query-Time / Server-Timing headers
+# (except on streamed responses, whose headers are sent first) and into the
+# app log; a statement shape repeated QUERY_REPEAT_THRESHOLD times
+# in one request is logged as an N+1 suspect. With QUERY_DEBUG_ENDPOINT set,
+# /debug/queries lists the slowest recent requests as JSON.
+#----------------------------------------------------------------------------#
+
+import heapq
+import itertools
+import re
+import threading
+import time
+from collections import Counter
+
+from flask import g, request, jsonify, has_request_context
+from sqlalchemy import event
+from sqlalchemy.engine import Engine
+
+_literals = re.compile(r"'(?:[^']|'')*'|\b\d+(?:\.\d+)?\b")
+_whitespace = re.compile(r'\s+')
+
+
+def statement_shape(statement):
+    """The statement with literals and whitespace runs collapsed, so that the
+    same query run with different values has the same shape."""
+    return _whitespace.sub(' ', _literals.sub('?', statement)).strip()
+
+
+class RequestStats(object):
+
+    def __init__(self, method, path):
+        self.method = method
+        self.path = path
+        self.started = time.perf_counter()
+        self.count = 0
+        self.seconds = 0.0
+        self.shapes = Counter()
+        self.shape_seconds = Counter()
+
+    def record(self, statement, seconds):
+        shape = statement_shape(statement)
+        self.count += 1
+        self.seconds += seconds
+        self.shapes[shape] += 1
+        self.shape_seconds[shape] += seconds
+
+    def repeated(self, threshold):
+        """(shape, count) of every statement shape run at least threshold times."""
+        return [(shape, n) for shape, n in self.shapes.most_common() if n >= threshold]
+
+    def elapsed(self):
+        return time.perf_counter() - self.started
+
+    def summary(self, threshold):
+        return {
+            'method': self.method,
+            'path': self.path,
+            'queries': self.count,
+            'query_ms': round(self.seconds * 1000, 2),
+            'total_ms': round(self.elapsed() * 1000, 2),
+            'repeated': [{'statement': shape, 'count': n,
+                          'ms': round(self.shape_seconds[shape] * 1000, 2)}
+                         for shape, n in self.repeated(threshold)],
+        }
+
+
+class QueryStats(object):
+    """Hooks SQL statement timing into an app's requests."""
+
+    def __init__(self, app=None):
+        self._slowest = []  # min-heap of (total seconds, seq, summary)
+        self._seq = itertools.count()
+        self._lock = threading.Lock()
+        self._observers = []
+        if app is not None:
+            self.init_app(app)
+
+    def init_app(self, app):
+        self.app = app
+        app.extensions['query_stats'] = self
+        app.config.setdefault('QUERY_REPEAT_THRESHOLD', 5)
+        app.config.setdefault('QUERY_WARN_COUNT', 50)
+        app.config.setdefault('QUERY_SLOW_REQUESTS', 20)
+        app.config.setdefault('QUERY_DEBUG_ENDPOINT', False)
+
+        event.listen(Engine, 'before_cursor_execute', self._before_execute)
+        event.listen(Engine, 'after_cursor_execute', self._after_execute)
+        app.before_request(self._start)
+        app.after_request(self._finish)
+        if app.config['QUERY_DEBUG_ENDPOINT']:
+            app.add_url_rule('/debug/queries', 'debug_queries', self.slowest_view)
+
+    def _before_execute(self, conn, cursor, statement, parameters, context, executemany):
+        conn.info.setdefault('query_started', []).append(time.perf_counter())
+
+    def _after_execute(self, conn, cursor, statement, parameters, context, executemany):
+        seconds = time.perf_counter() - conn.info['query_started'].pop()
+        stats = g.get('query_stats') if has_request_context() else None
+        if stats is not None:
+            stats.record(statement, seconds)
+
+    def _start(self):
+        g.query_stats = RequestStats(request.method, request.full_path.rstrip('?'))
+
+    def _finish(self, response):
+        stats = g.get('query_stats')
+        if stats is None:
+            return response
+        if response.is_streamed:
+            # the body's queries run after the headers are sent; report
+            # them once the response has been written out
+            response.call_on_close(lambda: self._report(stats))
+            return response
+        response.headers['X-Query-Count'] = str(stats.count)
+        response.headers['X-Query-Time'] = '%.2f' % (stats.seconds * 1000)
+        response.headers['Server-Timing'] = 'db;dur=%.2f;desc="%d queries", app;dur=%.2f' % (
+            stats.seconds * 1000, stats.count, stats.elapsed() * 1000)
+        self._report(stats)
+        return response
+
+    def observe(self, fn):
+        """Call fn(stats) with each request's RequestStats once its
+        statements are all counted, streamed bodies included."""
+        self._observers.append(fn)
+
+    def unobserve(self, fn):
+        self._observers.remove(fn)
+
+    def _report(self, stats):
+        for fn in list(self._observers):
+            fn(stats)
+        config = self.app.config
+        summary = stats.summary(config['QUERY_REPEAT_THRESHOLD'])
+        logger = self.app.logger
+        logger.info('%s %s: %d queries in %.1fms (%.1fms total)', stats.method, stats.path,
+                    stats.count, summary['query_ms'], summary['total_ms'])
+        for repeat in summary['repeated']:
+            logger.warning('possible N+1 in %s %s: %d x %s', stats.method, stats.path,
+                           repeat['count'], repeat['statement'])
+        if stats.count >= config['QUERY_WARN_COUNT']:
+            logger.warning('%s %s ran %d queries', stats.method, stats.path, stats.count)
+
+        with self._lock:
+            entry = (summary['total_ms'], next(self._seq), summary)
+            if len(self._slowest) < config['QUERY_SLOW_REQUESTS']:
+                heapq.heappush(self._slowest, entry)
+            elif entry > self._slowest[0]:
+                heapq.heapreplace(self._slowest, entry)
+
+    def slowest(self):
+        """Summaries of the slowest requests seen so far, slowest first."""
+        with self._lock:
+            return [summary for _, _, summary in sorted(self._slowest, reverse=True)]
+
+    def slowest_view(self):
+        return jsonify(requests=self.slowest())
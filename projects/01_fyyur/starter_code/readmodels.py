@@ -0,0 +1,26 @@
+#----------------------------------------------------------------------------#
+# Read models for the list pages.
+#
+# Each is a namedtuple of exactly the columns its page shows, filled with
+# _make() from a column query in the same order: no ORM entity is built,
+# nothing enters the session's identity map, and a namedtuple has no
+# per-instance __dict__.
+#----------------------------------------------------------------------------#
+
+from collections import namedtuple
+
+# /venues
+VenueListing = namedtuple('VenueListing', 'id name num_upcoming_shows')
+
+# /artists
+ArtistListing = namedtuple('ArtistListing', 'id name')
+
+# /venues/search and /artists/search
+SearchResult = namedtuple('SearchResult', 'id name city state num_upcoming_shows')
+
+# /shows
+ShowListing = namedtuple('ShowListing', 'id start_time venue_id venue_name '
+                                        'artist_id artist_name artist_image_link')
+
+# /top
+RankedListing = namedtuple('RankedListing', 'id name image_link upcoming_shows past_shows')
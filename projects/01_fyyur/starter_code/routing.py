@@ -0,0 +1,87 @@
+#----------------------------------------------------------------------------#
+# Read/write splitting between the primary database and read replicas.
+#
+# Replicas are Flask-SQLAlchemy binds named in REPLICA_BINDS. Statements go to
+# the primary unless the view is marked @read_only, in which case they go to
+# one replica (picked once per request), except:
+#   - while flushing, or inside `with use_primary():`;
+#   - for REPLICA_STICKY_SECONDS after this client's last commit, so that a
+#     redirect after a POST reads its own write.
+# A response read from a replica may lag the primary's table versions, so
+# @conditional gives it no validators (see conditional.py).
+#----------------------------------------------------------------------------#
+
+import random
+import time
+from contextlib import contextmanager
+from functools import wraps
+
+from flask import current_app, g, session, has_request_context
+from flask_sqlalchemy import SQLAlchemy, SignallingSession, get_state
+from sqlalchemy import orm
+
+STICKY_KEY = '_primary_until'
+
+
+def read_only(view):
+    """Mark a view as safe to serve from a read replica."""
+    @wraps(view)
+    def wrapper(*args, **kwargs):
+        g.read_only = True
+        return view(*args, **kwargs)
+    return wrapper
+
+
+@contextmanager
+def use_primary():
+    """Read from the primary inside a @read_only view, e.g. to fill a cache
+    that must not pick up replication lag."""
+    previous = g.get('use_primary', False)
+    g.use_primary = True
+    try:
+        yield
+    finally:
+        g.use_primary = previous
+
+
+def stick_to_primary(app):
+    """Route this client's reads to the primary for a while (after a write)."""
+    if has_request_context():
+        session[STICKY_KEY] = time.time() + app.config['REPLICA_STICKY_SECONDS']
+
+
+def served_from_replica(streamed=False):
+    """Whether this request has read from a replica so far or, for a streamed
+    response whose queries are still to run, whether they will: the replica
+    is then picked now."""
+    if streamed:
+        return _replica_bind(current_app) is not None
+    return has_request_context() and g.get('replica_bind') is not None
+
+
+def _replica_bind(app):
+    if not has_request_context() or not app.config['REPLICA_BINDS']:
+        return None
+    if not g.get('read_only') or g.get('use_primary'):
+        return None
+    if session.get(STICKY_KEY, 0) > time.time():
+        return None
+    if 'replica_bind' not in g:
+        g.replica_bind = random.choice(app.config['REPLICA_BINDS'])
+    return g.replica_bind
+
+
+class RoutingSession(SignallingSession):
+
+    def get_bind(self, mapper=None, clause=None):
+        if not self._flushing:
+            bind = _replica_bind(self.app)
+            if bind is not None:
+                return get_state(self.app).db.get_engine(self.app, bind=bind)
+        return SignallingSession.get_bind(self, mapper, clause)
+
+
+class RoutingSQLAlchemy(SQLAlchemy):
+
+    def create_session(self, options):
+        return orm.sessionmaker(class_=RoutingSession, db=self, **options)
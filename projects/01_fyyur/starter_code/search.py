@@ -0,0 +1,65 @@
+#----------------------------------------------------------------------------#
+# Venue and artist search.
+#
+# Backed by the indexes from migration 82913c56385a: a pg_trgm GIN index on
+# name serves the substring match, and a GIN index on
+# fyyur_search_document(name, city, genres) serves the full-text match.
+#----------------------------------------------------------------------------#
+
+from models import db, Venue, Artist, Show
+from readmodels import SearchResult
+
+SEARCH_CONFIG = 'simple'
+
+
+def _escape_like(term):
+    return term.replace('\\', '\\\\').replace('%', '\\%').replace('_', '\\_')
+
+
+def _search(model, show_fk, term, now, limit):
+    term = term.strip()
+    num_upcoming_shows = db.session.query(db.func.count(Show.id)) \
+        .filter(show_fk == model.id, Show.start_time > now) \
+        .correlate(model) \
+        .as_scalar()
+    query = db.session.query(
+        db.func.count().over().label('total'),
+        model.id,
+        model.name,
+        model.city,
+        model.state,
+        num_upcoming_shows.label('num_upcoming_shows'),
+    )
+
+    if term:
+        document = db.func.fyyur_search_document(model.name, model.city, model.genres)
+        tsquery = db.func.plainto_tsquery(SEARCH_CONFIG, term)
+        query = query.filter(db.or_(
+            model.name.ilike('%' + _escape_like(term) + '%', escape='\\'),
+            document.op('@@')(tsquery),
+        ))
+        # name similarity ranks substring hits; ts_rank lifts city/genre hits
+        rank = db.func.similarity(model.name, term) + db.func.ts_rank(document, tsquery)
+        query = query.order_by(rank.desc(), model.name)
+    else:
+        query = query.order_by(model.name)
+
+    rows = query.limit(limit).all()
+    return {
+        'count': rows[0].total if rows else 0,
+        'data': [SearchResult._make(row[1:]) for row in rows]
+    }
+
+
+def search_venues(term, now, limit=50):
+    """Venues whose name contains term, or whose name, city or genres match it.
+
+    Returns {'count': total matches, 'data': up to limit SearchResults},
+    best matches first.
+    """
+    return _search(Venue, Show.venue_id, term, now, limit)
+
+
+def search_artists(term, now, limit=50):
+    """Artist counterpart of search_venues()."""
+    return _search(Artist, Show.artist_id, term, now, limit)
@@ -2,3 +2,50 @@ window.parseISOString = function parseISOString(s) {
   var b = s.split(/\D+/);
   return new Date(Date.UTC(b[0], --b[1], b[2], b[3], b[4], b[5], b[6]));
 };
+
+// Type-ahead for the venue/artist search boxes, fed by /autocomplete.
+document.querySelectorAll('input[data-autocomplete]').forEach(function(input) {
+  var list = document.getElementById(input.getAttribute('list'));
+  var pending;
+  input.addEventListener('input', function() {
+    clearTimeout(pending);
+    pending = setTimeout(function() {
+      var url = '/autocomplete?type=' + input.dataset.autocomplete + '&q=' + encodeURIComponent(input.value);
+      fetch(url).then(function(response) { return response.json(); }).then(function(body) {
+        list.innerHTML = '';
+        body.results.forEach(function(result) {
+          var option = document.createElement('option');
+          option.value = result.name;
+          list.appendChild(option);
+        });
+      });
+    }, 100);
+  });
+});
+
+// Infinite scroll: a "more" link with data-infinite-scroll appends the next
+// page's items (JSON {html, next, page}) to its data-target list as it comes
+// into view; without JS, it simply links to the next page.
+document.querySelectorAll('a[data-infinite-scroll]').forEach(function(link) {
+  var list = document.getElementById(link.dataset.target);
+  var loading = false;
+  var observer = new IntersectionObserver(function(entries) {
+    if (!entries[0].isIntersecting || loading) return;
+    loading = true;
+    fetch(link.dataset.infiniteScroll).then(function(response) { return response.json(); }).then(function(body) {
+      list.insertAdjacentHTML('beforeend', body.html);
+      if (!body.next) {
+        observer.disconnect();
+        link.remove();
+        return;
+      }
+      link.dataset.infiniteScroll = body.next;
+      link.href = body.page;
+      loading = false;
+      // observe afresh, so a link still in view loads the page after too
+      observer.unobserve(link);
+      observer.observe(link);
+    }, function() { loading = false; });
+  });
+  observer.observe(link);
+});
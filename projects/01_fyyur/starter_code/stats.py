@@ -0,0 +1,166 @@
+#----------------------------------------------------------------------------#
+# Per-venue and per-artist show counts (VenueStats, ArtistStats).
+#
+# Maintained incrementally in the transaction that adds or deletes shows:
+# add_show() when a show is booked, remove_shows() and next_shows() around
+# deletes (writes.delete_rows), rebuild() after bulk loads. Shows only move
+# from upcoming to past with time; roll() recounts the rows whose next show
+# has started, found through the next_show index. Writes roll first; so
+# should cron, every minute or so, for the pages that read the counts:
+#
+#   flask stats roll
+#
+# These functions write through db.session and leave committing to the caller.
+#----------------------------------------------------------------------------#
+
+from datetime import datetime
+
+import click
+from flask.cli import AppGroup
+from sqlalchemy import and_, any_, bindparam, func, select
+from sqlalchemy.dialects.postgresql import ARRAY, insert
+
+from models import db, Venue, Artist, Show, VenueStats, ArtistStats
+from readmodels import RankedListing
+
+stats_cli = AppGroup('stats', help='Maintain the venue and artist show counts.')
+
+# (stats table, its key, the matching Show column, the entity table)
+KINDS = (
+    (VenueStats.__table__, VenueStats.__table__.c.venue_id, Show.__table__.c.venue_id, Venue.__table__),
+    (ArtistStats.__table__, ArtistStats.__table__.c.artist_id, Show.__table__.c.artist_id, Artist.__table__),
+)
+
+
+def _counts(key, show_key, now):
+    # the columns of a stats row, counted from the Show rows of key
+    shows = Show.__table__
+    upcoming = and_(show_key == key, shows.c.start_time > now)
+    return {
+        'upcoming_shows': select([func.count()]).where(upcoming).as_scalar(),
+        'past_shows': select([func.count()]).where(and_(show_key == key, shows.c.start_time <= now)).as_scalar(),
+        'next_show': select([func.min(shows.c.start_time)]).where(upcoming).as_scalar(),
+    }
+
+
+def roll(now):
+    """Recount the rows whose next show has started by now; returns how
+    many rows were recounted."""
+    rolled = 0
+    for stats, key, show_key, entity in KINDS:
+        rolled += db.session.execute(
+            stats.update().where(stats.c.next_show <= now).values(**_counts(key, show_key, now))).rowcount
+    return rolled
+
+
+@stats_cli.command('roll')
+def roll_command():
+    """Recount whoever's next show has started."""
+    rolled = roll(datetime.now())
+    db.session.commit()
+    click.echo('recounted %d rows' % rolled)
+
+
+def add_show(venue_id, artist_id, start_time, now):
+    """Count a show being booked."""
+    roll(now)
+    upcoming = start_time > now
+    for (stats, key, show_key, entity), id in zip(KINDS, (venue_id, artist_id)):
+        new = insert(stats).values({
+            key.name: id,
+            'upcoming_shows': int(upcoming),
+            'past_shows': int(not upcoming),
+            'next_show': start_time if upcoming else None,
+        })
+        db.session.execute(new.on_conflict_do_update(index_elements=[key], set_={
+            'upcoming_shows': stats.c.upcoming_shows + new.excluded.upcoming_shows,
+            'past_shows': stats.c.past_shows + new.excluded.past_shows,
+            # least() ignores NULLs
+            'next_show': func.least(stats.c.next_show, new.excluded.next_show),
+        }))
+
+
+def remove_shows(criterion, now):
+    """Uncount the shows matching criterion, before they are deleted.
+
+    Returns {stats table: [keys]} of the rows changed, whose next_show has to
+    be looked up again with next_shows() once the shows are gone.
+    """
+    roll(now)
+    shows = Show.__table__
+    changed = {}
+    for stats, key, show_key, entity in KINDS:
+        upcoming = shows.c.start_time > now
+        removed = select([
+            show_key.label('id'),
+            func.count().filter(upcoming).label('upcoming'),
+            func.count().filter(~upcoming).label('past'),
+        ]).where(criterion).group_by(show_key).alias('removed')
+        rows = db.session.execute(
+            stats.update()
+            .where(key == removed.c.id)
+            .values(upcoming_shows=stats.c.upcoming_shows - removed.c.upcoming,
+                    past_shows=stats.c.past_shows - removed.c.past)
+            .returning(key)).fetchall()
+        changed[stats] = [id for id, in rows]
+    return changed
+
+
+def next_shows(changed, now):
+    """Look up next_show again for the rows remove_shows() changed."""
+    shows = Show.__table__
+    for stats, key, show_key, entity in KINDS:
+        ids = changed.get(stats)
+        if not ids:
+            continue
+        db.session.execute(
+            stats.update()
+            .where(key == any_(bindparam('ids', ids, type_=ARRAY(key.type))))
+            .values(next_show=select([func.min(shows.c.start_time)])
+                    .where(and_(show_key == key, shows.c.start_time > now)).as_scalar()))
+
+
+def rebuild(now):
+    """Recount every venue and artist, e.g. after shows were bulk loaded."""
+    for stats, key, show_key, entity in KINDS:
+        db.session.execute(stats.delete())
+        counts = _counts(entity.c.id, show_key, now)
+        db.session.execute(stats.insert().from_select(
+            [key.name] + list(counts),
+            select([entity.c.id] + list(counts.values()))))
+
+
+def _key(stats_model):
+    return stats_model.__mapper__.primary_key[0]
+
+
+def show_counts(stats_model, id, now):
+    """(upcoming, past) show counts of a venue or artist, or None when its
+    row is due to be rolled and so can't be trusted."""
+    row = db.session.query(stats_model.upcoming_shows, stats_model.past_shows, stats_model.next_show) \
+        .filter(_key(stats_model) == id).first()
+    if row is None:
+        return 0, 0
+    if row.next_show is not None and row.next_show <= now:
+        return None
+    return row.upcoming_shows, row.past_shows
+
+
+def top(stats_model, model, by, limit):
+    """The limit venues or artists with the most upcoming shows (by
+    'upcoming') or shows overall (by 'total'), as RankedListings; read
+    straight off the ranking index, so the cost depends on limit alone."""
+    key = _key(stats_model)
+    if by == 'upcoming':
+        order = [stats_model.upcoming_shows.desc(), key]
+    elif by == 'total':
+        order = [(stats_model.upcoming_shows + stats_model.past_shows).desc(), key]
+    else:
+        raise ValueError('by must be "upcoming" or "total"')
+    rows = db.session.query(model.id, model.name, model.image_link,
+                            stats_model.upcoming_shows, stats_model.past_shows) \
+        .select_from(stats_model) \
+        .join(model, model.id == key) \
+        .order_by(*order) \
+        .limit(limit)
+    return [RankedListing._make(row) for row in rows]
@@ -0,0 +1,170 @@
+#----------------------------------------------------------------------------#
+# Query-plan regression tests.
+#
+#   python -m unittest -v test_query_plans
+#
+# Runs the hot queries against DATABASE_URL (migrated to head; the data can
+# be anything, even nothing), captures the SQL they send, and EXPLAINs it with
+# enable_seqscan off, so that the planner uses an index whenever one fits.
+# A test fails if its query still scans a table sequentially: an index it
+# relies on is missing, or the query no longer matches one. Skipped when the
+# database can't be reached.
+#----------------------------------------------------------------------------#
+
+import json
+import unittest
+from datetime import datetime, timedelta
+
+from sqlalchemy import event
+from sqlalchemy.engine import Engine
+from sqlalchemy.exc import OperationalError
+
+import app as fyyur
+import queries
+import search
+import stats
+from models import db, Venue, Artist, VenueStats, ArtistStats
+
+NOW = datetime(2030, 6, 1, 20, 0)
+
+
+def _nodes(plan):
+    yield plan
+    for child in plan.get('Plans', ()):
+        yield from _nodes(child)
+
+
+class QueryPlanTest(unittest.TestCase):
+
+    @classmethod
+    def setUpClass(cls):
+        cls.context = fyyur.app.app_context()
+        cls.context.push()
+        try:
+            db.session.execute('SELECT 1')
+        except OperationalError as e:
+            cls.context.pop()
+            raise unittest.SkipTest('database unavailable: %s' % e.orig)
+
+    @classmethod
+    def tearDownClass(cls):
+        db.session.remove()
+        cls.context.pop()
+
+    def setUp(self):
+        # for the captured statements too, so that an earlier one can't fail
+        # to plan and leave the transaction aborted
+        db.session.execute('SET LOCAL enable_seqscan = off')
+
+    def tearDown(self):
+        db.session.rollback()
+
+    def capture(self, call, *args, **kwargs):
+        """[(statement, parameters)] sent while running call(*args, **kwargs)."""
+        statements = []
+
+        def record(conn, cursor, statement, parameters, context, executemany):
+            if statement.split(None, 1)[0].upper() in ('SELECT', 'UPDATE', 'DELETE'):
+                statements.append((statement, parameters))
+
+        event.listen(Engine, 'before_cursor_execute', record)
+        try:
+            result = call(*args, **kwargs)
+            if hasattr(result, '__iter__') and not isinstance(result, (dict, list, tuple, set)):
+                list(result)  # lazy pages only query when iterated
+        finally:
+            event.remove(Engine, 'before_cursor_execute', record)
+        return statements
+
+    def assertIndexed(self, call, *args, **kwargs):
+        statements = self.capture(call, *args, **kwargs)
+        self.assertTrue(statements, 'ran no queries')
+        connection = db.session.connection()
+        for statement, parameters in statements:
+            result = connection.execute('EXPLAIN (FORMAT JSON) ' + statement, parameters)
+            plan = result.scalar()
+            if isinstance(plan, str):
+                plan = json.loads(plan)
+            plan = plan[0]['Plan']
+            scanned = sorted(set(node['Relation Name'] for node in _nodes(plan)
+                                 if node['Node Type'] == 'Seq Scan'))
+            if scanned:
+                self.fail('sequential scan of %s in\n%s\nplan:\n%s' % (
+                    ', '.join(scanned), statement, json.dumps(plan, indent=1)))
+
+    # venue and artist pages
+
+    def test_venue_detail(self):
+        self.assertIndexed(queries.venue_detail, 1, NOW)
+
+    def test_artist_upcoming_shows(self):
+        self.assertIndexed(queries.artist_schedule, 1, NOW, 'upcoming', 12)
+
+    def test_artist_past_shows(self):
+        self.assertIndexed(queries.artist_schedule, 1, NOW, 'past', 12)
+
+    def test_artist_shows_after_cursor(self):
+        cursor = queries.encode_cursor(NOW + timedelta(days=7), 1)
+        self.assertIndexed(queries.artist_schedule, 1, NOW, 'upcoming', 12, cursor)
+
+    def test_artist_show_counts(self):
+        self.assertIndexed(queries.artist_show_counts, 1, NOW)
+
+    def test_artists_first_page(self):
+        self.assertIndexed(queries.artists_page, 60)
+
+    def test_artists_page_after_cursor(self):
+        self.assertIndexed(queries.artists_page, 60, after='M')
+
+    def test_artists_from_letter(self):
+        self.assertIndexed(queries.artists_page, 60, start='B')
+
+    # /shows
+
+    def test_shows_first_page(self):
+        self.assertIndexed(queries.shows_page, 60)
+
+    def test_shows_page_after_cursor(self):
+        self.assertIndexed(queries.shows_page, 60, cursor=queries.encode_cursor(NOW, 1))
+
+    def test_shows_in_range(self):
+        self.assertIndexed(queries.shows_page, 60, start=NOW, end=NOW + timedelta(days=1))
+
+    # search
+
+    def test_search_venues(self):
+        self.assertIndexed(search.search_venues, 'hall', NOW)
+
+    def test_search_artists(self):
+        self.assertIndexed(search.search_artists, 'band', NOW)
+
+    # /top
+
+    def test_top_venues(self):
+        self.assertIndexed(stats.top, VenueStats, Venue, 'upcoming', 10)
+
+    def test_top_artists_overall(self):
+        self.assertIndexed(stats.top, ArtistStats, Artist, 'total', 10)
+
+    def test_roll_stats(self):
+        self.assertIndexed(stats.roll, NOW)
+
+    # bookings
+
+    def test_venue_conflicts(self):
+        self.assertIndexed(fyyur.venue_conflicts, 1, NOW)
+
+    def test_booked_venues(self):
+        # far enough back that the booking index doesn't cover it
+        self.assertIndexed(fyyur.booked_venues, datetime(2000, 1, 1), datetime(2000, 1, 2))
+
+    def test_booking_index_load(self):
+        fyyur.bookings.reset()
+        try:
+            self.assertIndexed(fyyur.booking_index)
+        finally:
+            fyyur.bookings.reset()
+
+
+if __name__ == '__main__':
+    unittest.main()
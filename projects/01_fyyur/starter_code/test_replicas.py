@@ -0,0 +1,78 @@
+#----------------------------------------------------------------------------#
+# Validators of pages read from a replica.
+#
+#   python -m unittest -v test_replicas
+#
+# Uses DATABASE_REPLICA_URLS as the replica, or else the primary itself:
+# which database answers doesn't matter here, only where the request was
+# routed. Skipped when the database can't be reached.
+#----------------------------------------------------------------------------#
+
+import os
+import unittest
+
+from sqlalchemy.exc import OperationalError
+
+import app as fyyur
+from models import db
+
+
+class ReplicaValidatorsTest(unittest.TestCase):
+
+    @classmethod
+    def setUpClass(cls):
+        config = fyyur.app.config
+        cls.saved = config['SQLALCHEMY_BINDS'], config['REPLICA_BINDS']
+        url = os.environ.get('DATABASE_REPLICA_URLS', '').split(',')[0].strip()
+        config['SQLALCHEMY_BINDS'] = dict(config['SQLALCHEMY_BINDS'] or {},
+                                          replica_test=url or config['SQLALCHEMY_DATABASE_URI'])
+        config['REPLICA_BINDS'] = ['replica_test']
+        with fyyur.app.app_context():
+            try:
+                db.get_engine(fyyur.app, bind='replica_test').execute('SELECT 1')
+            except OperationalError as e:
+                config['SQLALCHEMY_BINDS'], config['REPLICA_BINDS'] = cls.saved
+                raise unittest.SkipTest('database unavailable: %s' % e.orig)
+
+    @classmethod
+    def tearDownClass(cls):
+        config = fyyur.app.config
+        config['SQLALCHEMY_BINDS'], config['REPLICA_BINDS'] = cls.saved
+
+    def setUp(self):
+        self.client = fyyur.app.test_client()
+
+    def get(self, url):
+        response = self.client.get(url)
+        response.get_data()  # runs a streamed page's queries
+        response.close()
+        self.assertEqual(response.status_code, 200)
+        return response
+
+    def assertNoValidators(self, response):
+        self.assertIsNone(response.headers.get('ETag'))
+        self.assertIsNone(response.headers.get('Last-Modified'))
+
+    def test_page_read_from_replica(self):
+        self.assertNoValidators(self.get('/artists'))
+
+    def test_streamed_page_read_from_replica(self):
+        self.assertNoValidators(self.get('/shows'))
+
+    def test_api_read_from_replica(self):
+        self.assertNoValidators(self.get('/api/v1/shows'))
+
+    def test_page_read_from_primary(self):
+        # /venues is read from the primary, to fill its cache
+        self.assertIsNotNone(self.get('/venues').headers.get('ETag'))
+
+    def test_without_replicas(self):
+        fyyur.app.config['REPLICA_BINDS'] = []
+        try:
+            self.assertIsNotNone(self.get('/shows').headers.get('ETag'))
+        finally:
+            fyyur.app.config['REPLICA_BINDS'] = ['replica_test']
+
+
+if __name__ == '__main__':
+    unittest.main()
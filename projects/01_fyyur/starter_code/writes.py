@@ -0,0 +1,86 @@
+#----------------------------------------------------------------------------#
+# Set-based writes that bypass the ORM unit of work. They publish their own
+# cache.Change records once committed, as the ORM commit hook would.
+#----------------------------------------------------------------------------#
+
+from datetime import datetime
+
+from sqlalchemy import any_, bindparam, select
+from sqlalchemy.dialects.postgresql import ARRAY
+
+import stats
+from cache import Change, publish
+from models import db, Venue, Artist, Show
+
+
+class EditConflict(Exception):
+    """The row was saved by someone else after the edit was started."""
+
+
+def _same(stored, submitted):
+    # forms submit '' (or no genres) for a column the database holds as NULL
+    return stored == submitted or (stored is None and submitted in ('', []))
+
+
+def update_changed(model, id, version, values):
+    """Save an edit of row `id` that started from row version `version`.
+
+    Only the columns of `values` that differ from the stored row are written,
+    in one UPDATE ... WHERE id = :id AND version = :version that also bumps
+    the version; nothing is written when no column changed. Commits, and
+    returns the previous value of every column written (so {} when nothing
+    changed), or None when there is no such row. Raises EditConflict when
+    the stored version is no longer `version`.
+    """
+    table = model.__table__
+    row = db.session.execute(
+        select([table.c[name] for name in values] + [table.c.id, table.c.version])
+        .where(table.c.id == id)).first()
+    if row is None:
+        return None
+    if row.version != version:
+        raise EditConflict()
+
+    changed = dict((name, value) for name, value in values.items() if not _same(row[name], value))
+    if not changed:
+        return {}
+    result = db.session.execute(
+        table.update()
+        .where(table.c.id == id)
+        .where(table.c.version == version)
+        .values(version=table.c.version + 1, **changed))
+    if result.rowcount != 1:
+        # saved by someone else between the SELECT and the UPDATE
+        db.session.rollback()
+        raise EditConflict()
+    db.session.commit()
+
+    previous = dict((name, row[name]) for name in changed)
+    previous['version'] = version
+    snapshot = dict(row)
+    snapshot.update(changed, version=version + 1)
+    publish([Change('update', model, snapshot, previous)])
+    return previous
+
+
+def delete_rows(model, ids):
+    """Delete the rows of model with the given ids in one statement and commit.
+
+    Shows of a deleted venue or artist go with it through the ON DELETE
+    CASCADE foreign keys, without being loaded; the show counts of stats.py
+    are adjusted in the same transaction. Returns the deleted rows as dicts;
+    ids with no row are ignored.
+    """
+    table = model.__table__
+    ids = bindparam('ids', list(ids), type_=ARRAY(table.c.id.type))
+    show_key = {Venue: Show.venue_id, Artist: Show.artist_id, Show: Show.id}[model]
+    now = datetime.now()
+    changed = stats.remove_shows(show_key == any_(ids), now)
+    rows = db.session.execute(
+        table.delete().where(table.c.id == any_(ids)).returning(*table.c)).fetchall()
+    stats.next_shows(changed, now)
+    db.session.commit()
+    deleted = [dict(row) for row in rows]
+    if deleted:
+        publish([Change('delete', model, row, {}) for row in deleted])
+    return deleted